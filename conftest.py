@@ -0,0 +1,14 @@
+import pytest
+
+from core.testing import clear_process_caches, isolated_caches
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _isolated_caches(django_test_environment):
+    with isolated_caches():
+        yield
+
+
+@pytest.fixture(autouse=True)
+def _clear_process_caches():
+    clear_process_caches()
@@ -0,0 +1,43 @@
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import PAGE_VAR
+from django.core.exceptions import ValidationError
+
+
+class InputFilter(admin.SimpleListFilter):
+    """Фильтр с полем ввода вместо списка значений: боковая панель не
+    загружает в память все строки связанной таблицы
+    """
+    template = "admin/input_filter.html"
+    lookup = None
+
+    def lookups(self, request, model_admin):
+        # Пустой вариант нужен, чтобы фильтр вообще отображался
+        return ((None, None),)
+
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        try:
+            return queryset.filter(**{self.lookup: self.value().strip()})
+        except (ValueError, ValidationError) as e:
+            # Список покажет ошибку фильтра вместо 500
+            raise IncorrectLookupParameters(e)
+
+    def choices(self, changelist):
+        # Остальные параметры списка передаются скрытыми полями формы
+        all_choice = next(super().choices(changelist))
+        all_choice["query_parts"] = (
+            (key, value)
+            for key, value in changelist.params.items()
+            if key not in (self.parameter_name, PAGE_VAR)
+        )
+        yield all_choice
+
+
+def input_filter(parameter_name, title, lookup):
+    return type(f"{parameter_name.title()}InputFilter", (InputFilter,), {
+        "parameter_name": parameter_name,
+        "title": title,
+        "lookup": lookup,
+    })
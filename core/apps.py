@@ -0,0 +1,17 @@
+from django.apps import AppConfig
+
+
+class CoreConfig(AppConfig):
+    name = "core"
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.utils.module_loading import autodiscover_modules
+
+        from . import checks, mail, signals  # noqa
+        from .sql import install_dump_signal, install_wrapper
+
+        connection_created.connect(install_wrapper)
+        install_dump_signal()
+        # Задачи очереди регистрируются при импорте модулей <app>.tasks
+        autodiscover_modules("tasks")
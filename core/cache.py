@@ -0,0 +1,97 @@
+import os
+import pickle
+import time
+import zlib
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files import locks
+
+from .metrics import CACHE_REQUESTS, current_view
+
+
+MISSING = object()
+SHARED_CACHE_ALIAS = "shared"
+
+
+class InstrumentedCacheMixin:
+    """Считает попадания и промахи get() в метрике CACHE_REQUESTS"""
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, MISSING, version)
+        if value is MISSING:
+            CACHE_REQUESTS.inc(current_view.get(), "miss")
+            return default
+        CACHE_REQUESTS.inc(current_view.get(), "hit")
+        return value
+
+
+class InstrumentedLocMemCache(InstrumentedCacheMixin, LocMemCache):
+    pass
+
+
+class SharedFileBasedCache(FileBasedCache):
+    """Файловый кэш, общий для всех процессов сервера и воркера очереди.
+    add() и incr() проверяют и пишут значение под блокировкой файла,
+    поэтому атомарны и между процессами
+    """
+    lock_name = "lock"
+
+    @contextmanager
+    def locked(self):
+        self._createdir()
+        with open(os.path.join(self._dir, self.lock_name), "ab") as lock:
+            locks.lock(lock, locks.LOCK_EX)
+            try:
+                yield
+            finally:
+                locks.unlock(lock)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self.locked():
+            return super().add(key, value, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        # decr() вызывает incr() с отрицательным delta. В отличие от
+        # BaseCache.incr срок жизни ключа сохраняется прежним
+        with self.locked():
+            try:
+                with open(self._key_to_file(key, version), "rb") as f:
+                    expiry = pickle.load(f)
+                    value = pickle.loads(zlib.decompress(f.read()))
+            except FileNotFoundError:
+                expiry = value = None
+            now = time.time()
+            if value is None or expiry is not None and expiry < now:
+                raise ValueError(f"Key '{key}' not found")
+            value += delta
+            self.set(
+                key, value, None if expiry is None else expiry - now, version
+            )
+            return value
+
+
+class InstrumentedFileBasedCache(InstrumentedCacheMixin, SharedFileBasedCache):
+    pass
+
+
+class CacheProxy:
+    """Как django.core.cache.cache, но для любого alias: экземпляр кэша
+    берётся из caches при каждом обращении, поэтому переопределение
+    CACHES в тестах работает
+    """
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    def __getattr__(self, name):
+        return getattr(caches[self.alias], name)
+
+
+# Кэш, общий для процессов сервера и воркера run_tasks. В нём только
+# то, что должно быть видно всем процессам сразу: пользователи сессий,
+# поколения кэшей идентичностей и состояние лайков
+shared_cache = CacheProxy(SHARED_CACHE_ALIAS)
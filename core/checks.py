@@ -0,0 +1,54 @@
+from importlib.util import find_spec
+
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, Tags, register
+from django.utils.module_loading import import_string
+
+from .cache import SHARED_CACHE_ALIAS
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """Сессии, кэш пользователей сессий, состояние лайков и поколения
+    кэшей идентичностей должны быть видны всем процессам
+    """
+    config = settings.CACHES.get(SHARED_CACHE_ALIAS)
+    if config is None:
+        return [Error(
+            f"Не настроен общий кэш '{SHARED_CACHE_ALIAS}'",
+            hint="Добавьте его в CACHES: файловый, Memcached или Redis.",
+            id="core.E001",
+        )]
+    backend = import_string(config["BACKEND"])
+    if not issubclass(backend, LocMemCache):
+        return []
+    return [Error(
+        f"Общий кэш '{SHARED_CACHE_ALIAS}' хранится в памяти одного процесса",
+        hint=(
+            "Смена пароля или отключение аккаунта не сбросят кэш "
+            "пользователя в других процессах, а выход из аккаунта — его "
+            "сессию. Нужен общий кэш: файловый, Memcached или Redis."
+        ),
+        id="core.E001",
+    )]
+
+
+@register(Tags.templates)
+def check_jinja2(app_configs, **kwargs):
+    """JINJA2_TEMPLATES без установленного jinja2 и движка "jinja2"
+    в TEMPLATES ломал бы горячие страницы ошибкой 500
+    """
+    if not settings.JINJA2_TEMPLATES:
+        return []
+    engines = [engine.get("NAME") for engine in settings.TEMPLATES]
+    if find_spec("jinja2") is not None and "jinja2" in engines:
+        return []
+    return [Error(
+        "JINJA2_TEMPLATES включён, но движок шаблонов jinja2 недоступен",
+        hint=(
+            "Установите пакет jinja2 (движок добавляется в TEMPLATES "
+            "автоматически) или выключите JINJA2_TEMPLATES."
+        ),
+        id="core.E002",
+    )]
@@ -0,0 +1,34 @@
+import gzip
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def available_encodings():
+    """Поддерживаемые кодировки в порядке предпочтения"""
+    if brotli is not None:
+        return ("br", "gzip")
+    return ("gzip",)
+
+
+def compress(data, encoding, level):
+    if encoding == "br":
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+class StreamCompressor:
+    """Сжимает ответ по кускам, не собирая его целиком в памяти"""
+
+    def __init__(self, encoding, level):
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=level)
+            self.process, self.finish = compressor.process, compressor.finish
+        else:
+            compressor = zlib.compressobj(
+                level, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+            )
+            self.process, self.finish = compressor.compress, compressor.flush
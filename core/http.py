@@ -0,0 +1,63 @@
+def accepted_encodings(request):
+    """Кодировки из Accept-Encoding, кроме явно запрещённых через q=0"""
+    header = request.META.get("HTTP_ACCEPT_ENCODING", "")
+    encodings = set()
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00"):
+            continue
+        encodings.add(coding.strip().lower())
+    return encodings
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+def byte_range(header, size):
+    """Разбирает заголовок Range с одним диапазоном байт и возвращает
+    полуоткрытый интервал (start, stop). None — заголовка нет, он
+    некорректен или диапазонов несколько: тогда отдаётся весь файл
+    """
+    units, _, spec = (header or "").partition("=")
+    if units.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash or not (first or last):
+        return None
+    if not all(part.isdigit() for part in (first, last) if part):
+        return None
+    first = int(first) if first else None
+    last = int(last) if last else None
+    if first is None:
+        # bytes=-N: последние N байт
+        if last == 0 or size == 0:
+            raise RangeNotSatisfiable(header)
+        return max(size - last, 0), size
+    if last is not None and last < first:
+        return None
+    if first >= size:
+        raise RangeNotSatisfiable(header)
+    stop = size if last is None else min(last + 1, size)
+    return first, stop
+
+
+class FileRange:
+    """Файл, из которого можно прочитать не больше length байт с
+    текущей позиции. У него нет fileno(), поэтому wsgi.file_wrapper
+    не отправит через sendfile лишнее за пределами диапазона
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,110 @@
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.http import Http404
+
+from .cache import shared_cache
+
+
+class IdentityCache:
+    """Кэш в памяти процесса: значение уникального поля -> неизменяемый
+    кортеж нескольких полей строки. Ограничен по размеру (LRU) и по
+    времени жизни записи. Правка закэшированных полей в любом процессе
+    меняет поколение в общем кэше; процесс сверяет его не чаще раза в
+    IDENTITY_CACHE_CHECK_INTERVAL секунд и тогда сбрасывает свой кэш
+    """
+
+    instances = weakref.WeakSet()
+
+    def __init__(self, model, key_field, fields):
+        self.model = model
+        self.key_field = key_field
+        self.fields = tuple(fields)
+        self.generation_key = (
+            f"identity:{model._meta.label_lower}:{key_field}"
+        )
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.generation = None
+        self.checked_at = 0
+        self.instances.add(self)
+
+    def check_generation(self):
+        now = time.monotonic()
+        if now - self.checked_at < settings.IDENTITY_CACHE_CHECK_INTERVAL:
+            return
+        generation = shared_cache.get(self.generation_key)
+        if generation is None:
+            shared_cache.add(self.generation_key, time.time_ns(), None)
+            generation = shared_cache.get(self.generation_key)
+        with self.lock:
+            if generation != self.generation:
+                self.entries.clear()
+                self.generation = generation
+            self.checked_at = now
+
+    def get_record(self, key):
+        self.check_generation()
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.entries.move_to_end(key)
+                return entry[1]
+        record = self.model._default_manager.filter(
+            **{self.key_field: key}
+        ).values_list(*self.fields).first()
+        if record is None:
+            return None
+        with self.lock:
+            self.entries[key] = (now + settings.IDENTITY_CACHE_TTL, record)
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.IDENTITY_CACHE_SIZE:
+                self.entries.popitem(last=False)
+        return record
+
+    def get(self, key):
+        """Экземпляр модели с загруженными только закэшированными полями,
+        как после only(); остальные поля догружаются при обращении.
+        Каждый вызов возвращает новый объект, правки не попадут в кэш
+        """
+        record = self.get_record(key)
+        if record is None:
+            return None
+        return self.model.from_db(DEFAULT_DB_ALIAS, self.fields, record)
+
+    def get_or_404(self, key, **conditions):
+        """Замена get_object_or_404(model, key_field=key, ...); условия
+        проверяются только по закэшированным полям
+        """
+        instance = self.get(key)
+        if instance is None or any(
+            getattr(instance, name) != value
+            for name, value in conditions.items()
+        ):
+            raise Http404(
+                f"No {self.model._meta.object_name} matches the given query."
+            )
+        return instance
+
+    def snapshot(self, instance):
+        """Закэшированные поля экземпляра; незагруженные отложенные
+        поля дают None
+        """
+        return tuple(instance.__dict__.get(field) for field in self.fields)
+
+    def clear(self):
+        """Сбрасывает кэш только этого процесса"""
+        with self.lock:
+            self.entries.clear()
+
+    def invalidate(self):
+        self.clear()
+        try:
+            shared_cache.incr(self.generation_key)
+        except ValueError:
+            shared_cache.set(self.generation_key, time.time_ns(), None)
@@ -0,0 +1,76 @@
+import logging
+
+from django.template.backends import jinja2 as backend
+from django.template.defaultfilters import date, linebreaksbr
+from django.templatetags.static import static
+from django.urls import reverse
+from django.utils.formats import localize
+from django.utils.timezone import template_localtime
+from jinja2 import Environment
+from sorl.thumbnail import get_thumbnail
+from sorl.thumbnail.conf import settings as thumbnail_settings
+
+from posts.templatetags.hashtags import hashtags
+from posts.templatetags.pagination import elided_page_range
+from posts.templatetags.reactions import likes, views
+from users.templatetags.user_filters import addclass
+
+from .template_backends import InstrumentedTemplate
+
+
+logger = logging.getLogger("core.jinja2")
+
+
+def url(name, *args, **kwargs):
+    """Аналог {% url %}"""
+    return reverse(name, args=args, kwargs=kwargs)
+
+
+def thumbnail(file_, geometry, **options):
+    """Аналог {% thumbnail %}: миниатюра или None, если картинки нет
+    или её не удалось построить
+    """
+    if not file_:
+        return None
+    try:
+        return get_thumbnail(file_, geometry, **options)
+    except Exception:
+        if thumbnail_settings.THUMBNAIL_DEBUG:
+            raise
+        logger.exception("Thumbnail failed for %s", file_)
+        return None
+
+
+def localized(value):
+    """Значение так, как его выводит {{ value }} в шаблонах Django"""
+    return localize(template_localtime(value))
+
+
+def environment(**options):
+    env = Environment(**options)
+    env.globals.update({
+        "url": url,
+        "static": static,
+        "thumbnail": thumbnail,
+    })
+    env.filters.update({
+        "addclass": addclass,
+        "date": date,
+        "elided_page_range": elided_page_range,
+        "hashtags": hashtags,
+        "likes": likes,
+        "linebreaksbr": linebreaksbr,
+        "localize": localized,
+        "views": views,
+    })
+    return env
+
+
+class Jinja2(backend.Jinja2):
+    """Jinja2, который замеряет время отрисовки, как DjangoTemplates"""
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return InstrumentedTemplate(super().get_template(template_name))
@@ -0,0 +1,165 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.utils import timezone
+
+from .models import OutboxMessage
+from .tasks import task
+
+
+logger = logging.getLogger("core.mail")
+
+
+class OutboxEmailBackend(BaseEmailBackend):
+    """Не отправляет письма, а сохраняет их в таблицу OutboxMessage и
+    ставит в очередь задачу доставки. ATOMIC_REQUESTS выключен, так что
+    строка фиксируется сразу; откатываться вместе с другими изменениями
+    она будет, только если письмо отправлено внутри transaction.atomic()
+    """
+
+    def send_messages(self, email_messages):
+        outbox = []
+        for message in email_messages:
+            recipients = message.recipients()
+            if not recipients:
+                continue
+            outbox.append(OutboxMessage(
+                message=message.message().as_bytes(),
+                from_email=message.from_email,
+                recipients="\n".join(recipients),
+                subject=str(message.subject)[:255],
+            ))
+        OutboxMessage.objects.bulk_create(outbox)
+        if outbox:
+            deliver_outbox.delay(dedup_key="deliver_outbox")
+        return len(outbox)
+
+
+class RawMessage:
+    """Сохранённые байты MIME с интерфейсом, который почтовые бэкенды
+    Django ждут от EmailMessage.message()
+    """
+
+    def __init__(self, data):
+        self.data = data
+
+    def as_bytes(self, unixfrom=False, linesep="\n"):
+        # SMTP отправляет письмо со строками через \r\n
+        eol = linesep.encode()
+        return b"".join(line + eol for line in self.data.splitlines())
+
+    def get_charset(self):
+        return None
+
+
+class OutboxEmail(EmailMessage):
+    """Письмо из outbox: бэкенд отправляет сохранённые байты как есть,
+    адреса конверта (вместе со скрытыми копиями) берутся из строки
+    """
+
+    def __init__(self, outbox, connection=None):
+        super().__init__(
+            subject=outbox.subject,
+            from_email=outbox.from_email,
+            to=outbox.recipient_list,
+            connection=connection,
+        )
+        self.raw = bytes(outbox.message)
+
+    def message(self):
+        return RawMessage(self.raw)
+
+
+def claim(batch_size):
+    """Забирает пачку писем, которые пора отправить. Захват — это
+    аренда до next_attempt_at: письма упавшего отправителя вернутся в
+    работу, когда она истечёт
+    """
+    now = timezone.now()
+    due = OutboxMessage.objects.filter(
+        status__in=(OutboxMessage.PENDING, OutboxMessage.SENDING),
+        next_attempt_at__lte=now,
+    )
+    lease = now + timedelta(seconds=settings.OUTBOX_LOCK_TIMEOUT)
+    claimed = []
+    for outbox in due[:batch_size]:
+        if due.filter(pk=outbox.pk).update(
+            status=OutboxMessage.SENDING,
+            next_attempt_at=lease,
+        ):
+            claimed.append(outbox)
+    return claimed
+
+
+def backoff(attempts):
+    delay = settings.OUTBOX_RETRY_DELAY * 2 ** (attempts - 1)
+    return timedelta(seconds=min(delay, settings.OUTBOX_MAX_RETRY_DELAY))
+
+
+def deliver(batch_size=None):
+    """Отправляет пачку писем через EMAIL_DELIVERY_BACKEND по одному
+    соединению. Возвращает (отправлено, с ошибкой)
+    """
+    messages = claim(batch_size or settings.OUTBOX_BATCH_SIZE)
+    if not messages:
+        return 0, 0
+    sent = failed = 0
+    connection = get_connection(settings.EMAIL_DELIVERY_BACKEND)
+    try:
+        connection.open()
+    except Exception as error:
+        for outbox in messages:
+            mark_failed(outbox, error)
+        return 0, len(messages)
+    try:
+        for outbox in messages:
+            try:
+                connection.send_messages([OutboxEmail(outbox, connection)])
+            except Exception as error:
+                logger.exception("outbox message %s failed", outbox.pk)
+                mark_failed(outbox, error)
+                failed += 1
+            else:
+                outbox.status = OutboxMessage.SENT
+                outbox.sent_at = timezone.now()
+                outbox.save(update_fields=["status", "sent_at"])
+                sent += 1
+    finally:
+        connection.close()
+    return sent, failed
+
+
+def mark_failed(outbox, error):
+    outbox.attempts += 1
+    outbox.last_error = repr(error)
+    if outbox.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+        outbox.status = OutboxMessage.FAILED
+    else:
+        outbox.status = OutboxMessage.PENDING
+        outbox.next_attempt_at = timezone.now() + backoff(outbox.attempts)
+    outbox.save(update_fields=[
+        "attempts", "last_error", "status", "next_attempt_at",
+    ])
+
+
+def purge_sent():
+    """Удаляет отправленные письма старше OUTBOX_SENT_RETENTION секунд"""
+    deadline = timezone.now() - timedelta(
+        seconds=settings.OUTBOX_SENT_RETENTION
+    )
+    deleted, _ = OutboxMessage.objects.filter(
+        status=OutboxMessage.SENT, sent_at__lt=deadline
+    ).delete()
+    return deleted
+
+
+@task(name="core.deliver_outbox")
+def deliver_outbox():
+    while True:
+        sent, failed = deliver()
+        if not sent and not failed:
+            break
+    purge_sent()
@@ -0,0 +1,45 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from core.models import Blob
+from core.storage import ContentAddressedStorage
+
+
+class Command(BaseCommand):
+    help = "Удаляет файлы, на которые давно никто не ссылается"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace",
+            type=int,
+            default=settings.BLOB_GC_GRACE,
+            help="Сколько секунд файл без ссылок хранится до удаления",
+        )
+
+    def handle(self, *args, **options):
+        storage = ContentAddressedStorage()
+        deadline = timezone.now() - timedelta(seconds=options["grace"])
+        deleted = 0
+        for blob in Blob.objects.orphaned(deadline).iterator():
+            # Условие повторяется в DELETE: если за это время на файл
+            # сослались или его загрузили снова (register обновил
+            # released_at), строка не удалится и файл останется. Файл
+            # удаляется в той же транзакции, поэтому загрузка, ждущая
+            # строку, увидит, что его уже нет, и запишет заново
+            with transaction.atomic():
+                removed, _ = Blob.objects.orphaned(deadline).filter(
+                    pk=blob.pk
+                ).delete()
+                if not removed:
+                    continue
+                image_file = ImageFile(blob.name, storage)
+                default.kvstore.delete(image_file)
+                image_file.delete()
+            deleted += 1
+        self.stdout.write(f"Удалено файлов: {deleted}")
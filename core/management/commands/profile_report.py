@@ -0,0 +1,52 @@
+import glob
+import os
+import pstats
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.profiler import profiler_token
+
+
+class Command(BaseCommand):
+    help = "Сводка самых тяжёлых функций по накопленным .prof файлам"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "views",
+            nargs="*",
+            help="Имена URL; по умолчанию все, для которых есть профили",
+        )
+        parser.add_argument("--limit", type=int, default=20)
+        parser.add_argument(
+            "--sort",
+            default="cumulative",
+            help="Ключ сортировки pstats",
+        )
+        parser.add_argument(
+            "--token",
+            action="store_true",
+            help="Вывести подписанное значение заголовка для профилирования",
+        )
+
+    def handle(self, *args, **options):
+        if options["token"]:
+            self.stdout.write(
+                f"{settings.PROFILER_HEADER}: {profiler_token()}"
+            )
+            return
+        root = settings.PROFILER_DIR
+        views = options["views"]
+        if not views and os.path.isdir(root):
+            views = sorted(
+                name for name in os.listdir(root)
+                if os.path.isdir(os.path.join(root, name))
+            )
+        for view in views:
+            files = sorted(glob.glob(os.path.join(root, view, "*.prof")))
+            if not files:
+                continue
+            self.stdout.write(f"=== {view}: {len(files)} профилей")
+            stats = pstats.Stats(*files, stream=self.stdout)
+            stats.strip_dirs().sort_stats(options["sort"])
+            stats.print_stats(options["limit"])
@@ -0,0 +1,98 @@
+import multiprocessing
+import signal
+import threading
+from concurrent.futures import (
+    FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait,
+)
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.tasks import claim, execute, release_stale
+
+
+def process_pool(workers):
+    """Пул процессов запускается через spawn, и каждый процесс сам
+    вызывает django.setup(). При fork дети унаследовали бы соединения с
+    базой, которые release_stale() и claim() открыли в родителе
+    """
+    return ProcessPoolExecutor(
+        workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=django.setup,
+    )
+
+
+class Command(BaseCommand):
+    help = "Воркер локальной очереди задач"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.TASKS_WORKERS,
+            help="Размер пула; 0 — выполнять задачи в текущем потоке",
+        )
+        parser.add_argument(
+            "--processes",
+            action="store_true",
+            help="Пул процессов вместо пула потоков",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Выполнить готовые задачи и завершиться",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=settings.TASKS_POLL_INTERVAL,
+        )
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.shutdown)
+            signal.signal(signal.SIGINT, self.shutdown)
+        workers = options["workers"]
+        if workers == 0:
+            self.run_inline(options)
+            return
+        if options["processes"]:
+            executor = process_pool(workers)
+        else:
+            executor = ThreadPoolExecutor(workers)
+        running = set()
+        with executor:
+            while not self.stop.is_set():
+                release_stale()
+                for pk in claim(workers - len(running)):
+                    running.add(executor.submit(execute, pk))
+                if not running:
+                    if options["once"]:
+                        break
+                    self.stop.wait(options["poll_interval"])
+                    continue
+                _, running = wait(
+                    running,
+                    timeout=options["poll_interval"],
+                    return_when=FIRST_COMPLETED,
+                )
+            if running:
+                self.stdout.write(f"Ожидание {len(running)} задач")
+
+    def run_inline(self, options):
+        while not self.stop.is_set():
+            release_stale()
+            pks = claim(1)
+            for pk in pks:
+                execute(pk)
+            if not pks:
+                if options["once"]:
+                    break
+                self.stop.wait(options["poll_interval"])
+
+    def shutdown(self, signum, frame):
+        self.stdout.write("Остановка: новые задачи не берутся")
+        self.stop.set()
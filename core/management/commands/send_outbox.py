@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.mail import deliver, purge_sent
+
+
+class Command(BaseCommand):
+    help = "Отправляет накопленные в outbox письма пачками"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.OUTBOX_BATCH_SIZE,
+        )
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = deliver(options["batch_size"])
+            if not sent and not failed:
+                break
+            total_sent += sent
+            total_failed += failed
+        purged = purge_sent()
+        self.stdout.write(
+            f"Отправлено: {total_sent}, с ошибкой: {total_failed}, "
+            f"удалено старых: {purged}"
+        )
@@ -0,0 +1,314 @@
+import atexit
+import contextvars
+import glob
+import json
+import os
+import socket
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files import locks
+
+
+# Сумма снимков завершившихся процессов
+RETIRED_NAME = "retired.json"
+LOCK_NAME = "metrics.lock"
+
+DEFAULT_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# Имя URL текущего запроса, им помечаются метрики кэша, шаблонов и т.д.
+current_view = contextvars.ContextVar("current_view", default="unresolved")
+
+
+class Metric:
+    """Метрика с отдельным набором значений на каждый поток: пишет только
+    поток-владелец, поэтому блокировки не нужны, а при чтении значения
+    всех потоков складываются
+    """
+    type = None
+
+    def __init__(self, name, documentation, labelnames=("view",)):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._shards = {}
+
+    def _shard(self):
+        ident = threading.get_ident()
+        shard = self._shards.get(ident)
+        if shard is None:
+            shard = self._shards[ident] = {}
+        return shard
+
+    def collect(self):
+        result = {}
+        for shard in list(self._shards.values()):
+            for labels, value in list(shard.items()):
+                result[labels] = self.merge(result.get(labels), value)
+        return result
+
+    def describe(self):
+        return {
+            "type": self.type,
+            "help": self.documentation,
+            "labelnames": list(self.labelnames),
+        }
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *labels, amount=1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    @staticmethod
+    def merge(total, value):
+        return (total or 0) + value
+
+
+class Histogram(Metric):
+    """Гистограмма с фиксированными границами. Значение хранится как
+    счётчики попаданий в каждую корзину (последняя — +Inf) и сумма
+    """
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=("view",),
+                 buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        shard = self._shard()
+        values = shard.get(labels)
+        if values is None:
+            values = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        values[bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+
+    @staticmethod
+    def merge(total, value):
+        if total is None:
+            return list(value)
+        return [a + b for a, b in zip(total, value)]
+
+    def describe(self):
+        description = super().describe()
+        description["buckets"] = list(self.buckets)
+        return description
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.started = time.time()
+        self.last_flush = 0.0
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def snapshot(self):
+        snapshot = {}
+        for name, metric in self.metrics.items():
+            description = metric.describe()
+            description["samples"] = [
+                [list(labels), value]
+                for labels, value in metric.collect().items()
+            ]
+            snapshot[name] = description
+        return snapshot
+
+    def snapshot_path(self, directory):
+        return os.path.join(directory, "{}-{}-{}.json".format(
+            socket.gethostname(), os.getpid(), int(self.started * 1000)
+        ))
+
+    def flush(self, directory=None):
+        """Записывает значения процесса в общий каталог, откуда их
+        читает /metrics любого из воркеров
+        """
+        directory = directory or settings.METRICS_DIR
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        write_snapshot(self.snapshot_path(directory), self.snapshot())
+        self.last_flush = time.monotonic()
+
+    def maybe_flush(self):
+        if time.monotonic() - self.last_flush >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def merge(self, paths):
+        merged = {}
+        for path in paths:
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, description in snapshot.items():
+                metric = self.metrics.get(name)
+                if metric is None:
+                    continue
+                target = merged.setdefault(name, dict(description, samples={}))
+                samples = target["samples"]
+                for labels, value in description["samples"]:
+                    labels = tuple(labels)
+                    samples[labels] = metric.merge(samples.get(labels), value)
+        for description in merged.values():
+            description["samples"] = [
+                [list(labels), value]
+                for labels, value in description["samples"].items()
+            ]
+        return merged
+
+    def retire(self, directory):
+        """Складывает снимки завершившихся процессов этой машины в
+        retired.json и удаляет их: каталог не растёт с каждым
+        перезапуском воркера, а суммы счётчиков не уменьшаются.
+        Вызывается под блокировкой каталога, чтобы чтение не увидело
+        снимок и в retired.json, и в его собственном файле
+        """
+        paths = glob.glob(os.path.join(directory, "*.json"))
+        dead = [path for path in paths if not snapshot_alive(path)]
+        if not dead:
+            return
+        retired = os.path.join(directory, RETIRED_NAME)
+        write_snapshot(retired, self.merge([retired] + dead))
+        for path in dead:
+            os.remove(path)
+
+    def aggregate(self, directory=None):
+        """Сумма значений всех процессов (или только текущего, если общий
+        каталог не настроен)
+        """
+        directory = directory or settings.METRICS_DIR
+        if not directory:
+            return self.snapshot()
+        self.flush(directory)
+        with locked(directory):
+            self.retire(directory)
+            return self.merge(glob.glob(os.path.join(directory, "*.json")))
+
+    def render(self, directory=None):
+        """Текстовый формат Prometheus"""
+        lines = []
+        for name, description in sorted(self.aggregate(directory).items()):
+            lines.append(f"# HELP {name} {description['help']}")
+            lines.append(f"# TYPE {name} {description['type']}")
+            labelnames = description["labelnames"]
+            for labels, value in sorted(description["samples"]):
+                pairs = list(zip(labelnames, labels))
+                if description["type"] == "histogram":
+                    cumulative = 0
+                    bounds = description["buckets"] + ["+Inf"]
+                    for bound, count in zip(bounds, value):
+                        cumulative += count
+                        lines.append(
+                            f"{name}_bucket"
+                            f"{format_labels(pairs + [('le', bound)])} "
+                            f"{cumulative}"
+                        )
+                    lines.append(
+                        f"{name}_sum{format_labels(pairs)} {value[-1]}"
+                    )
+                    lines.append(
+                        f"{name}_count{format_labels(pairs)} {cumulative}"
+                    )
+                else:
+                    lines.append(f"{name}{format_labels(pairs)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def write_snapshot(path, snapshot):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, path)
+
+
+def snapshot_alive(path):
+    """Жив ли процесс, записавший снимок. О процессах других машин
+    судить нельзя: их снимки сворачивает своя машина
+    """
+    name = os.path.basename(path)[:-len(".json")]
+    parts = name.rsplit("-", 2)
+    if len(parts) == 3:
+        host, pid, _ = parts
+    elif len(parts) == 2:
+        # Снимок без имени машины, записанный до его появления
+        host, pid = socket.gethostname(), parts[0]
+    else:
+        return True
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+@contextmanager
+def locked(directory):
+    with open(os.path.join(directory, LOCK_NAME), "ab") as lock:
+        locks.lock(lock, locks.LOCK_EX)
+        try:
+            yield
+        finally:
+            locks.unlock(lock)
+
+
+def format_labels(pairs):
+    if not pairs:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return "{%s}" % ",".join(f'{name}="{value}"' for name, value in escaped)
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+REQUESTS = registry.register(Counter(
+    "yatube_requests_total",
+    "Обработанные запросы",
+    ("view", "status"),
+))
+REQUEST_LATENCY = registry.register(Histogram(
+    "yatube_request_duration_seconds",
+    "Время обработки запроса",
+))
+SQL_TIME = registry.register(Histogram(
+    "yatube_sql_duration_seconds",
+    "Суммарное время SQL-запросов за запрос",
+))
+TEMPLATE_TIME = registry.register(Histogram(
+    "yatube_template_render_seconds",
+    "Время отрисовки шаблона верхнего уровня",
+))
+CACHE_REQUESTS = registry.register(Counter(
+    "yatube_cache_requests_total",
+    "Обращения к кэшу",
+    ("view", "result"),
+))
+COMPRESSION_SAVED = registry.register(Counter(
+    "yatube_compression_saved_bytes_total",
+    "Байт сэкономлено сжатием ответов",
+    ("view", "encoding"),
+))
+COMPRESSION_CPU = registry.register(Counter(
+    "yatube_compression_cpu_seconds_total",
+    "Процессорное время на сжатие ответов",
+    ("view", "encoding"),
+))
@@ -0,0 +1,159 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from .compression import StreamCompressor, available_encodings, compress
+from .http import accepted_encodings
+from .metrics import (
+    COMPRESSION_CPU, COMPRESSION_SAVED, REQUEST_LATENCY, REQUESTS, SQL_TIME,
+    current_view, registry,
+)
+
+
+def report_compression(request, encoding, original, compressed, cpu_time):
+    view = view_name(request)
+    COMPRESSION_SAVED.inc(view, encoding, amount=original - compressed)
+    COMPRESSION_CPU.inc(view, encoding, amount=cpu_time)
+
+
+def view_name(request):
+    match = getattr(request, "resolver_match", None)
+    return (match.view_name if match else None) or "unresolved"
+
+
+class MetricsMiddleware:
+    """Время запроса, суммарное время SQL и счётчик ответов по имени URL"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sql_time = [0.0]
+
+        def time_query(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                sql_time[0] += time.perf_counter() - started
+
+        token = current_view.set("unresolved")
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(time_query))
+                response = self.get_response(request)
+        finally:
+            current_view.reset(token)
+        view = view_name(request)
+        REQUEST_LATENCY.observe(time.perf_counter() - started, view)
+        SQL_TIME.observe(sql_time[0], view)
+        REQUESTS.inc(view, str(response.status_code))
+        registry.maybe_flush()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        current_view.set(view_name(request))
+
+
+class ReplicaMiddleware:
+    """После запроса на запись ставит короткоживущую cookie, пока она есть,
+    чтения пользователя идут в основную базу (read-your-writes)
+    """
+    SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        safe = request.method in self.SAFE_METHODS
+        request.replica_allowed = (
+            safe and settings.REPLICA_STICKY_COOKIE not in request.COOKIES
+        )
+        response = self.get_response(request)
+        if not safe:
+            response.set_cookie(
+                settings.REPLICA_STICKY_COOKIE,
+                "1",
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+            )
+        return response
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Сжимает ответы gzip или brotli (если библиотека установлена).
+    Маленькие, уже сжатые и не текстовые ответы пропускаются
+    """
+
+    def process_response(self, request, response):
+        if (
+            response.has_header("Content-Encoding")
+            or response.status_code == 206
+        ):
+            return response
+        content_type = response.get("Content-Type", "").split(";")[0]
+        if content_type not in settings.COMPRESSION_CONTENT_TYPES:
+            return response
+        if (
+            not response.streaming
+            and len(response.content) < settings.COMPRESSION_MIN_SIZE
+        ):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        accepted = accepted_encodings(request)
+        for encoding in available_encodings():
+            if encoding in accepted:
+                break
+        else:
+            return response
+        level = settings.COMPRESSION_LEVELS[encoding]
+
+        if response.streaming:
+            response.streaming_content = self.compress_stream(
+                request, response.streaming_content, encoding, level
+            )
+            del response["Content-Length"]
+        else:
+            started = time.thread_time()
+            compressed = compress(response.content, encoding, level)
+            cpu_time = time.thread_time() - started
+            original = len(response.content)
+            if len(compressed) >= original:
+                return response
+            report_compression(
+                request, encoding, original, len(compressed), cpu_time
+            )
+            response.content = compressed
+            response["Content-Length"] = str(len(compressed))
+
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        response["Content-Encoding"] = encoding
+        return response
+
+    def compress_stream(self, request, chunks, encoding, level):
+        compressor = StreamCompressor(encoding, level)
+        original = compressed = 0
+        cpu_time = 0.0
+        for chunk in chunks:
+            original += len(chunk)
+            started = time.thread_time()
+            data = compressor.process(chunk)
+            cpu_time += time.thread_time() - started
+            if data:
+                compressed += len(data)
+                yield data
+        started = time.thread_time()
+        data = compressor.finish()
+        cpu_time += time.thread_time() - started
+        compressed += len(data)
+        yield data
+        report_compression(request, encoding, original, compressed, cpu_time)
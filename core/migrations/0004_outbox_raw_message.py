@@ -0,0 +1,34 @@
+# Generated by Django 2.2.6 on 2026-10-19 09:00
+
+import pickle
+
+from django.db import migrations, models
+
+
+def unpickle_pending(apps, schema_editor):
+    # Последний раз распаковываются письма, записанные прежним
+    # OutboxEmailBackend; дальше в таблице хранится только MIME
+    OutboxMessage = apps.get_model('core', 'OutboxMessage')
+    pending = OutboxMessage.objects.filter(status__in=('pending', 'sending'))
+    for outbox in pending.iterator():
+        email = pickle.loads(outbox.message)
+        outbox.message = email.message().as_bytes()
+        outbox.from_email = email.from_email
+        outbox.recipients = '\n'.join(email.recipients())
+        outbox.save(update_fields=['message', 'from_email', 'recipients'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxmessage',
+            name='from_email',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.RunPython(unpickle_pending, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,161 @@
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+
+
+class Task(models.Model):
+    """Отложенная задача локальной очереди (см. core.tasks)"""
+    PENDING = "pending"
+    RUNNING = "running"
+    FAILED = "failed"
+    STATUSES = (
+        (PENDING, "В очереди"),
+        (RUNNING, "Выполняется"),
+        (FAILED, "Ошибка"),
+    )
+
+    name = models.CharField(max_length=200)
+    payload = models.TextField(default="{}")
+    dedup_key = models.CharField(max_length=200, blank=True, null=True)
+    status = models.CharField(
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ("run_at",)
+        indexes = [
+            models.Index(fields=["status", "run_at"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["dedup_key"],
+                condition=Q(status="pending"),
+                name="pending_dedup_key",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk}"
+
+
+class OutboxMessage(models.Model):
+    """Письмо, сохранённое OutboxEmailBackend и ожидающее отправки
+    командой send_outbox
+    """
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUSES = (
+        (PENDING, "Ожидает"),
+        (SENDING, "Отправляется"),
+        (SENT, "Отправлено"),
+        (FAILED, "Ошибка"),
+    )
+
+    # Готовое письмо в формате MIME: при отправке оно не собирается
+    # заново и не распаковывается из pickle
+    message = models.BinaryField()
+    from_email = models.CharField(max_length=255, blank=True)
+    # Адреса конверта, включая скрытые копии, по одному на строку
+    recipients = models.TextField()
+    subject = models.CharField(max_length=255, blank=True)
+    status = models.CharField(
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ("created",)
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} → {', '.join(self.recipient_list)}"
+
+    @property
+    def recipient_list(self):
+        return self.recipients.splitlines()
+
+
+class BlobQuerySet(models.QuerySet):
+    def register(self, name):
+        """Отмечает только что загруженный файл. Пока на него никто не
+        сослался, он считается сиротой с отсчётом от момента загрузки
+        """
+        now = timezone.now()
+        # UPDATE ждёт транзакцию сборщика, если тот удаляет эту строку
+        if self.filter(name=name, refcount=0).update(released_at=now):
+            return
+        try:
+            with transaction.atomic():
+                self.create(name=name, released_at=now)
+        except IntegrityError:
+            self.filter(name=name, refcount=0).update(released_at=now)
+
+    def acquire(self, name):
+        if self.filter(name=name).update(
+            refcount=F("refcount") + 1,
+            released_at=None,
+        ):
+            return
+        try:
+            with transaction.atomic():
+                self.create(name=name, refcount=1)
+        except IntegrityError:
+            self.filter(name=name).update(
+                refcount=F("refcount") + 1,
+                released_at=None,
+            )
+
+    def release(self, name):
+        # CASE видит значение refcount до обновления
+        self.filter(name=name, refcount__gt=0).update(
+            refcount=F("refcount") - 1,
+            released_at=Case(
+                When(refcount=1, then=Value(
+                    timezone.now(),
+                    output_field=models.DateTimeField(),
+                )),
+                default=F("released_at"),
+            ),
+        )
+
+    def orphaned(self, before):
+        return self.filter(refcount=0, released_at__lt=before)
+
+
+class Blob(models.Model):
+    """Файл ContentAddressedStorage и число ссылающихся на него записей.
+    Файлы без ссылок дольше BLOB_GC_GRACE удаляет команда collect_blobs
+    """
+    name = models.CharField(max_length=255, unique=True)
+    refcount = models.PositiveIntegerField(default=0)
+    released_at = models.DateTimeField(blank=True, null=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    objects = BlobQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["refcount", "released_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount})"
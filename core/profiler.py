@@ -0,0 +1,70 @@
+import cProfile
+import os
+import random
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+
+
+SIGNING_SALT = "core.profiler"
+
+
+def profiler_token():
+    """Подписанное значение заголовка PROFILER_HEADER для ручного
+    профилирования отдельного запроса
+    """
+    return signing.TimestampSigner(salt=SIGNING_SALT).sign("profile")
+
+
+def has_valid_token(request):
+    header = settings.PROFILER_HEADER.upper().replace("-", "_")
+    token = request.META.get(f"HTTP_{header}")
+    if not token:
+        return False
+    try:
+        signing.TimestampSigner(salt=SIGNING_SALT).unsign(
+            token, max_age=settings.PROFILER_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return False
+    return True
+
+
+class ProfilerMiddleware:
+    """Профилирует cProfile выборку запросов (PROFILER_SAMPLE_RATE) и
+    запросы с подписанным заголовком, складывая .prof файлы в
+    PROFILER_DIR/<url_name>/. Выключенный профилировщик убирается из
+    цепочки middleware целиком
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILER_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.PROFILER_SAMPLE_RATE
+
+    def __call__(self, request):
+        if not (
+            random.random() < self.sample_rate or has_valid_token(request)
+        ):
+            return self.get_response(request)
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        self.dump(request, profiler)
+        return response
+
+    def dump(self, request, profiler):
+        match = request.resolver_match
+        name = (match.view_name if match else None) or "unresolved"
+        directory = os.path.join(
+            settings.PROFILER_DIR, name.replace(":", "_")
+        )
+        os.makedirs(directory, exist_ok=True)
+        filename = f"{time.time():.6f}-{os.getpid()}.prof"
+        profiler.dump_stats(os.path.join(directory, filename))
@@ -0,0 +1,57 @@
+import random
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+replica_allowed = ContextVar("replica_allowed", default=False)
+
+
+class ReplicaRouter:
+    """Чтения из view, помеченных read_only, уходят на одну из реплик
+    REPLICA_DATABASES; всё остальное работает с основной базой
+    """
+
+    def db_for_read(self, model, **hints):
+        if (
+            replica_allowed.get()
+            and settings.REPLICA_DATABASES
+            and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return random.choice(settings.REPLICA_DATABASES)
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Объекты, прочитанные с реплики, сохраняются в основную базу
+        instance = hints.get("instance")
+        if (
+            instance is not None
+            and instance._state.db in settings.REPLICA_DATABASES
+        ):
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На репликах те же данные, что и в основной базе
+        aliases = {DEFAULT_DB_ALIAS, *settings.REPLICA_DATABASES}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+def read_only(view):
+    """Разрешает view читать с реплики, если ReplicaMiddleware не
+    запретил это для запроса (запись или недавняя запись пользователя)
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not getattr(request, "replica_allowed", False):
+            return view(request, *args, **kwargs)
+        token = replica_allowed.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            replica_allowed.reset(token)
+    return wrapper
@@ -0,0 +1,156 @@
+import heapq
+import logging
+import os
+import re
+import signal
+import sys
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+
+
+logger = logging.getLogger("core.sql")
+
+PROJECT_ROOT = settings.BASE_DIR + os.sep
+# Обёртки проекта, которые сами ничего не запрашивают
+SKIPPED_FILES = {
+    os.path.join(PROJECT_ROOT, "core", name)
+    for name in ("sql.py", "middleware.py", "cache.py", "template_backends.py")
+}
+
+NUMBER_RE = re.compile(r"\b\d+(\.\d+)?\b")
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+IN_LIST_RE = re.compile(r"\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)")
+SPACE_RE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def normalize(sql):
+    """Приводит SQL к «отпечатку»: литералы и списки IN заменяются на ?"""
+    sql = STRING_RE.sub("?", sql)
+    sql = NUMBER_RE.sub("?", sql)
+    sql = IN_LIST_RE.sub("(?)", sql)
+    return SPACE_RE.sub(" ", sql).strip()
+
+
+def relative(path):
+    if path.startswith(PROJECT_ROOT):
+        return path[len(PROJECT_ROOT):]
+    return path
+
+
+def call_site():
+    """Первое место в коде проекта, откуда пришёл запрос: строка
+    Python-модуля или узел шаблона ({{ post.comments.count }} и т.п.)
+    """
+    frame = sys._getframe(1)
+    while frame is not None:
+        code = frame.f_code
+        if code.co_name == "render_annotated":
+            node = frame.f_locals.get("self")
+            token = getattr(node, "token", None)
+            origin = getattr(node, "origin", None)
+            if token is not None and origin is not None:
+                return f"{relative(origin.name)}:{token.lineno} {token.contents}"
+        filename = code.co_filename
+        if filename.startswith(PROJECT_ROOT) and filename not in SKIPPED_FILES:
+            return f"{relative(filename)}:{frame.f_lineno} {code.co_name}"
+        frame = frame.f_back
+    return "unknown"
+
+
+class QueryStats:
+    """Накопленные по отпечаткам запросов количество и время"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.fingerprints = {}
+
+    def add(self, fingerprint, duration):
+        with self.lock:
+            count, total, worst = self.fingerprints.get(
+                fingerprint, (0, 0.0, 0.0)
+            )
+            self.fingerprints[fingerprint] = (
+                count + 1, total + duration, max(worst, duration)
+            )
+            if len(self.fingerprints) > settings.SLOW_QUERY_MAX_FINGERPRINTS:
+                self.evict()
+
+    def evict(self):
+        # Оставляем более дорогую половину, чтобы словарь не рос без конца
+        keep = len(self.fingerprints) // 2
+        self.fingerprints = dict(heapq.nlargest(
+            keep, self.fingerprints.items(), key=lambda item: item[1][1]
+        ))
+
+    def top(self, limit=None):
+        """Самые дорогие по суммарному времени отпечатки"""
+        with self.lock:
+            items = list(self.fingerprints.items())
+        return heapq.nlargest(
+            limit or settings.SLOW_QUERY_TOP_N,
+            items,
+            key=lambda item: item[1][1],
+        )
+
+    def reset(self):
+        with self.lock:
+            self.fingerprints.clear()
+
+    def dump(self, limit=None):
+        for fingerprint, (count, total, worst) in self.top(limit):
+            logger.info(
+                "top query: total=%.1fms count=%d max=%.1fms %s",
+                total * 1000, count, worst * 1000, fingerprint,
+            )
+
+
+query_stats = QueryStats()
+
+
+def log_queries(execute, sql, params, many, context):
+    """execute-wrapper: замеряет каждый запрос и пишет в лог медленные"""
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        fingerprint = normalize(sql)
+        query_stats.add(fingerprint, duration)
+        if duration >= settings.SLOW_QUERY_THRESHOLD:
+            logger.warning(
+                "slow query %.1fms params=%d at %s: %s",
+                duration * 1000,
+                len(params or ()),
+                call_site(),
+                fingerprint,
+                extra={
+                    "duration": duration,
+                    "alias": context["connection"].alias,
+                },
+            )
+
+
+def install_wrapper(sender, connection, **kwargs):
+    # В начало списка: connection.execute_wrapper() снимает последнюю
+    # обёртку, и наша не должна попасть под неё
+    if log_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, log_queries)
+
+
+def dump_on_signal(signum, frame):
+    query_stats.dump()
+
+
+def install_dump_signal():
+    """По SIGUSR1 топ запросов процесса пишется в лог, если включено
+    SLOW_QUERY_DUMP_SIGNAL
+    """
+    if not settings.SLOW_QUERY_DUMP_SIGNAL or not hasattr(signal, "SIGUSR1"):
+        return
+    if threading.current_thread() is not threading.main_thread():
+        return
+    signal.signal(signal.SIGUSR1, dump_on_signal)
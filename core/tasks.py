@@ -0,0 +1,160 @@
+import json
+import logging
+import os
+import random
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from .models import Task
+
+
+logger = logging.getLogger("core.tasks")
+
+registry = {}
+
+
+class TaskFunction:
+    def __init__(self, func, name, max_attempts):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, dedup_key=None, run_at=None, **kwargs):
+        return enqueue(
+            self.name, args, kwargs,
+            dedup_key=dedup_key,
+            run_at=run_at,
+            max_attempts=self.max_attempts,
+        )
+
+
+def task(func=None, *, name=None, max_attempts=None):
+    """Регистрирует функцию как задачу очереди. Вызов func.delay(...)
+    кладёт задачу в таблицу одним INSERT и сразу возвращает управление
+    """
+    def register(func):
+        task_name = name or f"{func.__module__}.{func.__name__}"
+        wrapper = TaskFunction(
+            func,
+            task_name,
+            max_attempts or settings.TASKS_MAX_ATTEMPTS,
+        )
+        registry[task_name] = wrapper
+        return wrapper
+    if func is not None:
+        return register(func)
+    return register
+
+
+def enqueue(name, args=(), kwargs=None, dedup_key=None, run_at=None,
+            max_attempts=None):
+    """Ставит задачу в очередь. Пока в очереди есть задача с тем же
+    dedup_key, повторная не добавляется. Строка пишется в текущей
+    транзакции: вне atomic() (ATOMIC_REQUESTS выключен) она фиксируется
+    сразу, независимо от остальных изменений запроса
+    """
+    task = Task(
+        name=name,
+        payload=json.dumps(
+            {"args": list(args), "kwargs": kwargs or {}},
+            cls=DjangoJSONEncoder,
+        ),
+        dedup_key=dedup_key,
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts or settings.TASKS_MAX_ATTEMPTS,
+    )
+    if dedup_key is None:
+        task.save()
+    else:
+        Task.objects.bulk_create([task], ignore_conflicts=True)
+    return task
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def backoff(attempts):
+    delay = settings.TASKS_RETRY_DELAY * 2 ** (attempts - 1)
+    delay = min(delay, settings.TASKS_MAX_RETRY_DELAY)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def release_stale():
+    """Возвращает в очередь задачи, чей воркер пропал не закончив их"""
+    deadline = timezone.now() - timedelta(seconds=settings.TASKS_LOCK_TIMEOUT)
+    stale = Task.objects.filter(status=Task.RUNNING, locked_at__lt=deadline)
+    for task in stale:
+        retry(task, "Воркер не завершил задачу")
+
+
+def claim(limit):
+    """Забирает до limit готовых к выполнению задач. Захват —
+    условный UPDATE, поэтому несколько воркеров не возьмут одну задачу
+    """
+    now = timezone.now()
+    candidates = Task.objects.filter(
+        status=Task.PENDING,
+        run_at__lte=now,
+    ).values_list("pk", flat=True)[:limit]
+    claimed = []
+    for pk in candidates:
+        updated = Task.objects.filter(pk=pk, status=Task.PENDING).update(
+            status=Task.RUNNING,
+            locked_by=worker_id(),
+            locked_at=now,
+        )
+        if updated:
+            claimed.append(pk)
+    return claimed
+
+
+def retry(task, error):
+    task.attempts += 1
+    task.last_error = error
+    task.locked_by = ""
+    task.locked_at = None
+    if task.attempts >= task.max_attempts:
+        task.status = Task.FAILED
+        logger.error("task %s failed permanently: %s", task, error)
+    else:
+        task.status = Task.PENDING
+        task.run_at = timezone.now() + backoff(task.attempts)
+    try:
+        with transaction.atomic():
+            task.save()
+    except IntegrityError:
+        # Пока задача выполнялась, в очередь уже поставили такую же
+        task.delete()
+
+
+def execute(pk):
+    """Выполняет одну захваченную задачу; вызывается в потоке или
+    процессе пула воркера
+    """
+    close_old_connections()
+    try:
+        task = Task.objects.get(pk=pk)
+        func = registry.get(task.name)
+        try:
+            if func is None:
+                raise LookupError(f"Задача {task.name} не зарегистрирована")
+            payload = json.loads(task.payload)
+            func(*payload["args"], **payload["kwargs"])
+        except Exception:
+            logger.exception("task %s raised", task)
+            retry(task, traceback.format_exc())
+            return False
+        task.delete()
+        return True
+    finally:
+        close_old_connections()
@@ -0,0 +1,32 @@
+import time
+
+from django.template.backends import django
+
+from .metrics import TEMPLATE_TIME, current_view
+
+
+class InstrumentedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            TEMPLATE_TIME.observe(
+                time.perf_counter() - started, current_view.get()
+            )
+
+
+class DjangoTemplates(django.DjangoTemplates):
+    """DjangoTemplates, который замеряет время отрисовки шаблонов"""
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return InstrumentedTemplate(super().get_template(template_name))
@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from unittest import TextTestResult
+
+from django.conf import settings
+from django.core.cache.backends.filebased import FileBasedCache
+from django.db import connections
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+from django.utils.module_loading import import_string
+
+from .identity import IdentityCache
+
+
+@contextmanager
+def isolated_caches():
+    """Файловые кэши во временном каталоге: тесты не видят кэш
+    запущенного сайта и прошлых прогонов
+    """
+    caches = {}
+    directory = tempfile.mkdtemp(prefix="yatube-cache-")
+    try:
+        for alias, config in settings.CACHES.items():
+            if issubclass(import_string(config["BACKEND"]), FileBasedCache):
+                config = dict(config, LOCATION=os.path.join(directory, alias))
+            caches[alias] = config
+        with override_settings(CACHES=caches):
+            yield
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def clear_process_caches():
+    """Откат транзакции теста не отправляет сигналов, поэтому кэши
+    процесса могут помнить строки, которых в базе уже нет
+    """
+    for identity in list(IdentityCache.instances):
+        identity.clear()
+
+
+def open_connections():
+    """Алиасы баз с открытым в этом потоке соединением"""
+    return [
+        connection.alias for connection in connections.all()
+        if connection.connection is not None
+    ]
+
+
+class TestResult(TextTestResult):
+    def startTest(self, test):
+        clear_process_caches()
+        super().startTest(test)
+
+
+class TestRunner(DiscoverRunner):
+    def get_resultclass(self):
+        return super().get_resultclass() or TestResult
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.caches = isolated_caches()
+        self.caches.__enter__()
+
+    def teardown_test_environment(self, **kwargs):
+        self.caches.__exit__(None, None, None)
+        super().teardown_test_environment(**kwargs)
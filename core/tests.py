@@ -0,0 +1,670 @@
+import gzip
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.flatpages.models import FlatPage
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends import smtp
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .checks import check_jinja2, check_shared_cache
+from .compression import brotli
+from .mail import OutboxEmail, deliver_outbox
+from .metrics import Counter, Histogram, Registry
+from .models import OutboxMessage, Task
+from .middleware import CompressionMiddleware
+from .profiler import profiler_token
+from .sql import dump_on_signal, install_dump_signal, normalize, query_stats
+from .management.commands.run_tasks import process_pool
+from .tasks import release_stale, task
+from .testing import open_connections
+from .views import FLATPAGES_VERSION_KEY
+
+
+STATIC_SOURCE = tempfile.mkdtemp()
+MEDIA_ROOT = tempfile.mkdtemp()
+STATIC_ROOT = tempfile.mkdtemp()
+CSS = b"body { color: red; }\n" * 100
+
+
+@override_settings(
+    STATIC_ROOT=STATIC_ROOT,
+    STATICFILES_DIRS=[STATIC_SOURCE],
+    STATICFILES_FINDERS=[
+        "django.contrib.staticfiles.finders.FileSystemFinder",
+    ],
+)
+class StaticFilesTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        os.makedirs(os.path.join(STATIC_SOURCE, "css"), exist_ok=True)
+        with open(os.path.join(STATIC_SOURCE, "css", "site.css"), "wb") as f:
+            f.write(CSS)
+        call_command("collectstatic", interactive=False, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(STATIC_SOURCE, ignore_errors=True)
+        shutil.rmtree(STATIC_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_hashed_and_compressed(self):
+        """collectstatic создаёт файл с хэшем в имени и его сжатые копии"""
+        url = staticfiles_storage.url("css/site.css")
+        self.assertRegex(url, r"^/static/css/site\.[0-9a-f]{12}\.css$")
+        hashed = os.path.join(STATIC_ROOT, url[len("/static/"):])
+        with open(hashed + ".gz", "rb") as f:
+            self.assertEqual(gzip.decompress(f.read()), CSS)
+        self.assertEqual(os.path.exists(hashed + ".br"), brotli is not None)
+
+    def test_serve_precompressed(self):
+        """Сжатая копия выбирается по Accept-Encoding, кэш бессрочный"""
+        url = staticfiles_storage.url("css/site.css")
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Content-Type"], "text/css")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertIn("Accept-Encoding", response["Vary"])
+        body = b"".join(response.streaming_content)
+        self.assertEqual(gzip.decompress(body), CSS)
+
+    def test_serve_identity(self):
+        response = self.client.get(
+            "/static/css/site.css",
+            HTTP_ACCEPT_ENCODING="gzip;q=0",
+        )
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertNotIn("immutable", response["Cache-Control"])
+        self.assertEqual(b"".join(response.streaming_content), CSS)
+
+
+class CompressionMiddlewareTestCase(SimpleTestCase):
+    def setUp(self):
+        self.middleware = CompressionMiddleware(lambda request: None)
+        self.factory = RequestFactory()
+        self.html = b"<p>Yatube</p>" * 200
+
+    def compress(self, response, accept="gzip"):
+        request = self.factory.get("/", HTTP_ACCEPT_ENCODING=accept)
+        return self.middleware.process_response(request, response)
+
+    def test_gzip(self):
+        response = self.compress(HttpResponse(self.html))
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), self.html)
+        self.assertEqual(response["Content-Length"], str(len(response.content)))
+
+    def test_brotli(self):
+        if brotli is None:
+            self.skipTest("brotli не установлен")
+        response = self.compress(HttpResponse(self.html), "gzip, br")
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(brotli.decompress(response.content), self.html)
+
+    def test_skip_small_and_binary(self):
+        """Маленькие, уже сжатые и не текстовые ответы не сжимаются"""
+        encoded = HttpResponse(self.html)
+        encoded["Content-Encoding"] = "br"
+        responses = (
+            HttpResponse(b"<p>Yatube</p>"),
+            HttpResponse(self.html, content_type="image/png"),
+            encoded,
+        )
+        for response in responses:
+            content = response.content
+            response = self.compress(response)
+            self.assertEqual(response.content, content)
+            self.assertNotEqual(response.get("Content-Encoding"), "gzip")
+
+    def test_streaming(self):
+        response = self.compress(
+            StreamingHttpResponse(self.html[i:i + 100]
+                                  for i in range(0, len(self.html), 100))
+        )
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertFalse(response.has_header("Content-Length"))
+        body = b"".join(response.streaming_content)
+        self.assertEqual(gzip.decompress(body), self.html)
+
+
+class FlatPageCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.page = FlatPage.objects.create(
+            url="/about-author/",
+            title="Об авторе",
+            content="Тестовый автор",
+        )
+        self.page.sites.add(1)
+
+    def test_anonymous_burst_no_queries(self):
+        """Повторные запросы анонима к странице не ходят в базу"""
+        self.client.get("/about-author/")
+        with self.assertNumQueries(0):
+            for _ in range(3):
+                response = self.client.get("/about-author/")
+        self.assertContains(response, "Тестовый автор")
+
+    def test_invalidated_on_save(self):
+        self.client.get("/about-author/")
+        self.page.content = "Новый текст"
+        self.page.save()
+        self.assertContains(self.client.get("/about-author/"), "Новый текст")
+        self.page.delete()
+        self.assertEqual(self.client.get("/about-author/").status_code, 404)
+
+    def test_version_evicted(self):
+        """Вытесненная версия не возвращает старый HTML из кэша"""
+        cache.delete(FLATPAGES_VERSION_KEY)
+        self.client.get("/about-author/")
+        self.page.content = "Новый текст"
+        self.page.save()
+        self.client.get("/about-author/")
+        cache.delete(FLATPAGES_VERSION_KEY)
+        self.assertContains(self.client.get("/about-author/"), "Новый текст")
+
+    def test_conditional_get(self):
+        etag = self.client.get("/about-author/")["ETag"]
+        response = self.client.get("/about-author/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_about_prefix(self):
+        response = self.client.get("/about/about-author/")
+        self.assertContains(response, "Тестовый автор")
+
+
+class ProfilerTestCase(TestCase):
+    def setUp(self):
+        self.profiles = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profiles, ignore_errors=True)
+
+    def test_disabled_by_default(self):
+        with override_settings(PROFILER_DIR=self.profiles):
+            self.client.get("/auth/signup/", HTTP_X_PROFILE=profiler_token())
+        self.assertEqual(os.listdir(self.profiles), [])
+
+    def test_signed_header(self):
+        """Запрос с подписанным заголовком профилируется, с поддельным — нет"""
+        with override_settings(
+            PROFILER_ENABLED=True,
+            PROFILER_SAMPLE_RATE=0,
+            PROFILER_DIR=self.profiles,
+        ):
+            self.client.get("/auth/signup/", HTTP_X_PROFILE="forged")
+            self.assertEqual(os.listdir(self.profiles), [])
+            self.client.get("/auth/signup/", HTTP_X_PROFILE=profiler_token())
+            self.assertEqual(os.listdir(self.profiles), ["signup"])
+            out = StringIO()
+            call_command("profile_report", "--limit", "5", stdout=out)
+        self.assertIn("=== signup: 1", out.getvalue())
+        self.assertIn("cumulative", out.getvalue())
+
+
+class MetricsTestCase(TestCase):
+    def test_histogram_and_counter(self):
+        registry = Registry()
+        latency = registry.register(
+            Histogram("latency", "Задержка", buckets=(0.1, 1))
+        )
+        hits = registry.register(Counter("hits", "Попадания"))
+        latency.observe(0.05, "index")
+        latency.observe(0.5, "index")
+        latency.observe(5, "index")
+        hits.inc("index")
+        hits.inc("index", amount=2)
+        text = registry.render()
+        self.assertIn('latency_bucket{view="index",le="0.1"} 1', text)
+        self.assertIn('latency_bucket{view="index",le="1"} 2', text)
+        self.assertIn('latency_bucket{view="index",le="+Inf"} 3', text)
+        self.assertIn('latency_count{view="index"} 3', text)
+        self.assertIn('hits{view="index"} 3', text)
+
+    def test_multiprocess_aggregation(self):
+        """Значения разных процессов складываются через общий каталог"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        workers = []
+        for started in (1, 2):
+            registry = Registry()
+            registry.started = started
+            hits = registry.register(Counter("hits", "Попадания"))
+            hits.inc("post", amount=started)
+            registry.flush(directory)
+            workers.append(registry)
+        self.assertIn('hits{view="post"} 3', workers[0].render(directory))
+
+    def test_dead_workers_retired(self):
+        """Снимки завершившихся процессов сворачиваются в retired.json,
+        и сумма от этого не меняется
+        """
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        dead = subprocess.Popen(["true"])
+        dead.wait()
+        workers = []
+        for amount in (2, 1):
+            registry = Registry()
+            hits = registry.register(Counter("hits", "Попадания"))
+            hits.inc("post", amount=amount)
+            workers.append(registry)
+        workers[0].flush(directory)
+        dead_name = f"{socket.gethostname()}-{dead.pid}-1.json"
+        os.rename(
+            workers[0].snapshot_path(directory),
+            os.path.join(directory, dead_name),
+        )
+        for _ in range(2):
+            self.assertIn('hits{view="post"} 3', registry.render(directory))
+        self.assertEqual(sorted(os.listdir(directory)), sorted([
+            os.path.basename(registry.snapshot_path(directory)),
+            "metrics.lock",
+            "retired.json",
+        ]))
+
+    def test_endpoint(self):
+        """Запросы попадают в метрики с именем URL"""
+        self.client.get("/auth/signup/")
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        self.assertIn(
+            'yatube_requests_total{view="signup",status="200"}', text
+        )
+        self.assertIn(
+            'yatube_template_render_seconds_count{view="signup"}', text
+        )
+        response = self.client.get("/metrics", REMOTE_ADDR="10.0.0.1")
+        self.assertEqual(response.status_code, 404)
+
+
+class SlowQueryLogTestCase(TestCase):
+    def setUp(self):
+        from posts.models import Post
+        user = get_user_model().objects.create_user(username="TestUser")
+        self.post = Post.objects.create(text="Тестовый пост", author=user)
+        query_stats.reset()
+        cache.clear()
+
+    def test_normalize(self):
+        self.assertEqual(
+            normalize("SELECT * FROM t WHERE id IN (1, 2,3) AND  s = 'a''b'"),
+            "SELECT * FROM t WHERE id IN (?) AND s = ?",
+        )
+
+    @override_settings(SLOW_QUERY_THRESHOLD=0)
+    def test_call_site(self):
+        """Медленный запрос привязывается к строке view или шаблона"""
+        with self.assertLogs("core.sql", "WARNING") as logs:
+            self.client.get(f"/TestUser/{self.post.id}/")
+        output = "\n".join(logs.output)
+        self.assertIn("posts/views.py:", output)
+        self.assertIn(
+            "templates/includes/post_item.html:29 if post.comments.exists",
+            output,
+        )
+        fingerprints = [fingerprint for fingerprint, _ in query_stats.top()]
+        self.assertTrue(any("posts_comment" in f for f in fingerprints))
+        with self.assertLogs("core.sql", "INFO") as logs:
+            query_stats.dump(limit=1)
+        self.assertEqual(len(logs.output), 1)
+
+    def test_dump_signal_is_opt_in(self):
+        previous = signal.getsignal(signal.SIGUSR1)
+        self.addCleanup(signal.signal, signal.SIGUSR1, previous)
+        install_dump_signal()
+        self.assertIs(signal.getsignal(signal.SIGUSR1), previous)
+        with override_settings(SLOW_QUERY_DUMP_SIGNAL=True):
+            install_dump_signal()
+        self.assertIs(signal.getsignal(signal.SIGUSR1), dump_on_signal)
+
+
+@override_settings(REPLICA_DATABASES=["replica"])
+class ReplicaRoutingTestCase(TransactionTestCase):
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        from posts.models import Group, Post
+        cache.clear()
+        # Одинаковые пользователь и группа в обеих базах, а посты разные,
+        # чтобы по странице было видно, откуда шло чтение
+        for alias, text in (("replica", "Пост с реплики"),
+                            ("default", "Пост с мастера")):
+            user = get_user_model().objects.db_manager(alias).create_user(
+                username="TestUser", password="1fx6|unz#i"
+            )
+            group = Group.objects.using(alias).create(
+                title="Группа", slug="testgroup", description="Описание"
+            )
+            Post.objects.using(alias).create(
+                text=text, author=user, group=group
+            )
+        self.client.force_login(user)
+
+    def test_reads_from_replica(self):
+        response = self.client.get("/group/testgroup")
+        self.assertContains(response, "Пост с реплики")
+        self.assertNotContains(response, "Пост с мастера")
+
+    def test_writes_and_sticky_reads_use_primary(self):
+        """После записи пользователь читает из основной базы"""
+        from posts.models import Post
+        response = self.client.post("/new/", {"text": "Новый пост"})
+        self.assertIn("use_primary", response.cookies)
+        self.assertTrue(Post.objects.using("default").filter(
+            text="Новый пост"
+        ).exists())
+        self.assertFalse(Post.objects.using("replica").filter(
+            text="Новый пост"
+        ).exists())
+        response = self.client.get("/group/testgroup")
+        self.assertContains(response, "Пост с мастера")
+
+
+CALLS = []
+
+
+@task(name="core.tests.record")
+def record(value):
+    CALLS.append(value)
+
+
+@task(name="core.tests.explode", max_attempts=2)
+def explode():
+    raise RuntimeError("Бум")
+
+
+class SharedCacheCheckTestCase(SimpleTestCase):
+    def test_process_local_cache(self):
+        self.assertEqual(check_shared_cache(None), [])
+        local = {"BACKEND": "core.cache.InstrumentedLocMemCache"}
+        with override_settings(CACHES={"default": local, "shared": local}):
+            errors = check_shared_cache(None)
+        self.assertEqual([error.id for error in errors], ["core.E001"])
+        with override_settings(CACHES={"default": local}):
+            errors = check_shared_cache(None)
+        self.assertEqual([error.id for error in errors], ["core.E001"])
+
+
+class Jinja2CheckTestCase(SimpleTestCase):
+    def test_missing_jinja2(self):
+        self.assertEqual(check_jinja2(None), [])
+        with override_settings(JINJA2_TEMPLATES=True):
+            with mock.patch("core.checks.find_spec", return_value=None):
+                errors = check_jinja2(None)
+        self.assertEqual([error.id for error in errors], ["core.E002"])
+
+
+class TaskQueueTestCase(TestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def run_worker(self):
+        call_command(
+            "run_tasks", "--once", "--workers", "0", stdout=StringIO()
+        )
+
+    def test_enqueue_and_run(self):
+        """Задачи с одинаковым dedup_key не дублируются в очереди"""
+        record.delay("а", dedup_key="same")
+        record.delay("а", dedup_key="same")
+        record.delay("б")
+        self.assertEqual(Task.objects.count(), 2)
+        self.run_worker()
+        self.assertEqual(sorted(CALLS), ["а", "б"])
+        self.assertFalse(Task.objects.exists())
+
+    def test_delayed(self):
+        record.delay("потом", run_at=timezone.now() + timedelta(hours=1))
+        self.run_worker()
+        self.assertEqual(CALLS, [])
+
+    def test_retry_with_backoff(self):
+        """Упавшая задача откладывается, после max_attempts помечается
+        ошибочной
+        """
+        explode.delay()
+        self.run_worker()
+        failed = Task.objects.get()
+        self.assertEqual(failed.status, Task.PENDING)
+        self.assertEqual(failed.attempts, 1)
+        self.assertGreater(failed.run_at, timezone.now())
+        self.assertIn("Бум", failed.last_error)
+        Task.objects.update(run_at=timezone.now())
+        self.run_worker()
+        failed.refresh_from_db()
+        self.assertEqual(failed.status, Task.FAILED)
+        self.assertEqual(failed.attempts, 2)
+
+    def test_release_stale(self):
+        record.delay("зависшая")
+        Task.objects.update(
+            status=Task.RUNNING,
+            locked_at=timezone.now() - timedelta(days=1),
+        )
+        release_stale()
+        self.assertEqual(Task.objects.get().status, Task.PENDING)
+
+    def test_process_pool_connections(self):
+        """Процесс пула не наследует соединение, открытое воркером"""
+        release_stale()
+        self.assertIn("default", open_connections())
+        with process_pool(1) as pool:
+            self.assertEqual(pool.submit(open_connections).result(), [])
+
+
+class BrokenEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionError("Почтовый сервер недоступен")
+
+
+@override_settings(
+    EMAIL_BACKEND="core.mail.OutboxEmailBackend",
+    EMAIL_DELIVERY_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+)
+class OutboxTestCase(TestCase):
+    def setUp(self):
+        get_user_model().objects.create_user(
+            username="TestUser",
+            email="testovy@email.com",
+            password="1fx6|unz#i",
+        )
+
+    def reset_password(self):
+        self.client.post(
+            "/auth/password_reset/", {"email": "testovy@email.com"}
+        )
+
+    def test_request_only_records(self):
+        """Запрос на сброс пароля только пишет письмо в outbox"""
+        self.reset_password()
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboxMessage.objects.get().recipients,
+                         "testovy@email.com")
+        self.assertTrue(
+            Task.objects.filter(name="core.deliver_outbox").exists()
+        )
+        call_command("send_outbox", stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["testovy@email.com"])
+        self.assertEqual(OutboxMessage.objects.get().status,
+                         OutboxMessage.SENT)
+
+    def test_file_backend(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.reset_password()
+        with override_settings(
+            EMAIL_DELIVERY_BACKEND=(
+                "django.core.mail.backends.filebased.EmailBackend"
+            ),
+            EMAIL_FILE_PATH=directory,
+        ):
+            call_command("send_outbox", stdout=StringIO())
+        [name] = os.listdir(directory)
+        with open(os.path.join(directory, name)) as f:
+            self.assertIn("To: testovy@email.com", f.read())
+
+    def test_raw_message(self):
+        """В outbox хранится готовый MIME, SMTP получает его байты как
+        есть, со скрытыми копиями в адресах конверта
+        """
+        mail.EmailMessage(
+            "Тема", "Текст", "site@yatube.ru", ["to@yatube.ru"],
+            bcc=["bcc@yatube.ru"],
+        ).send()
+        outbox = OutboxMessage.objects.get()
+        self.assertEqual(outbox.from_email, "site@yatube.ru")
+        self.assertEqual(outbox.recipient_list,
+                         ["to@yatube.ru", "bcc@yatube.ru"])
+        self.assertNotIn(b"bcc@yatube.ru", outbox.message)
+        backend = smtp.EmailBackend()
+        backend.connection = mock.Mock()
+        self.assertTrue(backend._send(OutboxEmail(outbox)))
+        sendmail = backend.connection.sendmail
+        from_email, recipients, data = sendmail.call_args[0]
+        self.assertEqual(from_email, "site@yatube.ru")
+        self.assertEqual(recipients, ["to@yatube.ru", "bcc@yatube.ru"])
+        self.assertEqual(data.replace(b"\r\n", b"\n").rstrip(),
+                         bytes(outbox.message).rstrip())
+
+    def test_purge_sent(self):
+        self.reset_password()
+        call_command("send_outbox", stdout=StringIO())
+        self.reset_password()
+        call_command("send_outbox", stdout=StringIO())
+        old = OutboxMessage.objects.first()
+        OutboxMessage.objects.filter(pk=old.pk).update(
+            sent_at=timezone.now() - timedelta(days=30)
+        )
+        deliver_outbox()
+        self.assertQuerysetEqual(
+            OutboxMessage.objects.all(),
+            [OutboxMessage.SENT],
+            transform=lambda outbox: outbox.status,
+        )
+        self.assertFalse(OutboxMessage.objects.filter(pk=old.pk).exists())
+
+    @override_settings(
+        EMAIL_DELIVERY_BACKEND="core.tests.BrokenEmailBackend",
+        OUTBOX_MAX_ATTEMPTS=2,
+    )
+    def test_retry(self):
+        self.reset_password()
+        call_command("send_outbox", stdout=StringIO())
+        outbox = OutboxMessage.objects.get()
+        self.assertEqual(outbox.status, OutboxMessage.PENDING)
+        self.assertEqual(outbox.attempts, 1)
+        self.assertGreater(outbox.next_attempt_at, timezone.now())
+        OutboxMessage.objects.update(next_attempt_at=timezone.now())
+        call_command("send_outbox", stdout=StringIO())
+        outbox.refresh_from_db()
+        self.assertEqual(outbox.status, OutboxMessage.FAILED)
+
+
+MEDIA = bytes(range(256)) * 4
+HASHED_NAME = "posts/ab/cd/%s.gif" % ("abcd" * 16)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, MEDIA_SENDFILE=None)
+class MediaServingTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for name in ("posts/file.bin", HASHED_NAME):
+            path = os.path.join(MEDIA_ROOT, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(MEDIA)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def get(self, path="/media/posts/file.bin", **headers):
+        return self.client.get(path, **headers)
+
+    def test_full_file(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), MEDIA)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["Content-Length"], str(len(MEDIA)))
+        self.assertEqual(self.get("/media/posts/missing.bin").status_code, 404)
+        self.assertEqual(self.get("/media/../manage.py").status_code, 404)
+
+    def test_private_prefixes(self):
+        """Временные загрузки и служебные файлы по /media/ не отдаются"""
+        for name in ("tmp/upload", "prerender/index.html"):
+            path = os.path.join(MEDIA_ROOT, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(MEDIA)
+            self.assertEqual(self.get("/media/" + name).status_code, 404)
+        response = self.get("/media/posts/../tmp/upload")
+        self.assertEqual(response.status_code, 404)
+
+    def test_ranges(self):
+        """Диапазоны отдаются кодом 206 и только запрошенными байтами"""
+        response = self.get(HTTP_RANGE="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), MEDIA[10:20])
+        self.assertEqual(response["Content-Range"], "bytes 10-19/1024")
+        self.assertEqual(response["Content-Length"], "10")
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+        response = self.get(HTTP_RANGE="bytes=-5")
+        self.assertEqual(b"".join(response.streaming_content), MEDIA[-5:])
+        response = self.get(HTTP_RANGE="bytes=1000-")
+        self.assertEqual(b"".join(response.streaming_content), MEDIA[1000:])
+
+        response = self.get(HTTP_RANGE="bytes=2000-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */1024")
+        for header in ("bytes=0-1,5-6", "bytes=5-1", "items=0-1"):
+            self.assertEqual(self.get(HTTP_RANGE=header).status_code, 200)
+
+    def test_conditional(self):
+        etag = self.get()["ETag"]
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        response = self.get(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        response = self.get(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"old"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_offload(self):
+        """С MEDIA_SENDFILE тело отдаёт фронтенд-сервер"""
+        with override_settings(MEDIA_SENDFILE="x-accel-redirect"):
+            response = self.get()
+        self.assertEqual(
+            response["X-Accel-Redirect"], "/protected-media/posts/file.bin"
+        )
+        self.assertEqual(response.content, b"")
+        with override_settings(MEDIA_SENDFILE="x-sendfile"):
+            response = self.get()
+        self.assertEqual(
+            response["X-Sendfile"],
+            os.path.join(MEDIA_ROOT, "posts/file.bin"),
+        )
+
+    def test_cache_control(self):
+        """Файлы с хэшем содержимого в имени кэшируются навсегда"""
+        response = self.get("/media/" + HASHED_NAME)
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertNotIn("immutable", self.get()["Cache-Control"])
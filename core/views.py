@@ -0,0 +1,254 @@
+import hashlib
+import mimetypes
+import os
+import posixpath
+import time
+from urllib.parse import quote
+
+from django.conf import settings
+from django.contrib.flatpages.models import FlatPage
+from django.contrib.flatpages.views import render_flatpage
+from django.contrib.sites.shortcuts import get_current_site
+from django.core.cache import cache
+from django.contrib.staticfiles import views as staticfiles_views
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseNotModified,
+    HttpResponsePermanentRedirect,
+)
+from django.utils._os import safe_join
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers,
+)
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.static import was_modified_since
+
+from .http import (
+    FileRange, RangeNotSatisfiable, accepted_encodings, byte_range,
+)
+from .metrics import registry
+from .storage import ContentAddressedStorage
+
+
+STATIC_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+FLATPAGES_VERSION_KEY = "flatpages:version"
+FLATPAGE_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def serve_static(request, path):
+    """Отдаёт собранную статику: сжатую копию по Accept-Encoding и
+    вечное кэширование для файлов с хэшем в имени
+    """
+    path = posixpath.normpath(path).lstrip("/")
+    try:
+        fullpath = safe_join(settings.STATIC_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404(path)
+    if not os.path.isfile(fullpath):
+        if settings.DEBUG:
+            return staticfiles_views.serve(request, path)
+        raise Http404(path)
+
+    content_type, _ = mimetypes.guess_type(fullpath)
+    encoding = None
+    accepted = accepted_encodings(request)
+    for coding, suffix in STATIC_ENCODINGS:
+        if coding in accepted and os.path.isfile(fullpath + suffix):
+            encoding = coding
+            fullpath += suffix
+            break
+
+    statobj = os.stat(fullpath)
+    if not was_modified_since(
+        request.META.get("HTTP_IF_MODIFIED_SINCE"),
+        statobj.st_mtime,
+        statobj.st_size,
+    ):
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(
+            open(fullpath, "rb"),
+            content_type=content_type or "application/octet-stream",
+        )
+        response["Last-Modified"] = http_date(statobj.st_mtime)
+        if encoding:
+            response["Content-Encoding"] = encoding
+    patch_vary_headers(response, ("Accept-Encoding",))
+    hashed_files = getattr(staticfiles_storage, "hashed_files", {})
+    if path in hashed_files.values():
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=settings.STATIC_HASHED_MAX_AGE,
+            immutable=True,
+        )
+    else:
+        patch_cache_control(response, public=True, max_age=60)
+    return response
+
+
+def range_allowed(request, etag, last_modified):
+    """If-Range: диапазон отдаётся, только если файл не изменился"""
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def media_response(request, path, fullpath, statobj, etag):
+    content_type, _ = mimetypes.guess_type(fullpath)
+    content_type = content_type or "application/octet-stream"
+    # Передаём файл фронтенду: диапазоны он обработает сам
+    if settings.MEDIA_SENDFILE == "x-sendfile":
+        response = HttpResponse(content_type=content_type)
+        response["X-Sendfile"] = fullpath
+        return response
+    if settings.MEDIA_SENDFILE == "x-accel-redirect":
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = quote(
+            settings.MEDIA_ACCEL_REDIRECT_PREFIX + path
+        )
+        return response
+
+    size = statobj.st_size
+    span = None
+    if range_allowed(request, etag, int(statobj.st_mtime)):
+        try:
+            span = byte_range(request.META.get("HTTP_RANGE"), size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+    file = open(fullpath, "rb")
+    if span is None:
+        return FileResponse(file, content_type=content_type)
+    start, stop = span
+    file.seek(start)
+    response = FileResponse(
+        FileRange(file, stop - start),
+        content_type=content_type,
+        status=206,
+    )
+    response["Content-Length"] = str(stop - start)
+    response["Content-Range"] = f"bytes {start}-{stop - 1}/{size}"
+    return response
+
+
+def serve_media(request, path):
+    """Адрес /media/: отдаёт только файлы с префиксами из
+    MEDIA_PUBLIC_PREFIXES, то есть картинки записей и их миниатюры
+    """
+    path = posixpath.normpath(path).lstrip("/")
+    if not path.startswith(tuple(settings.MEDIA_PUBLIC_PREFIXES)):
+        raise Http404(path)
+    return send_media_file(request, path)
+
+
+def send_media_file(request, path):
+    """Отдаёт файл из MEDIA_ROOT с поддержкой Range и условных запросов.
+    Если настроен MEDIA_SENDFILE, сам файл отдаёт фронтенд-сервер, а
+    иначе он потоково читается FileResponse (целиком — через
+    wsgi.file_wrapper и sendfile, если сервер их поддерживает)
+    """
+    path = posixpath.normpath(path).lstrip("/")
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404(path)
+    if not os.path.isfile(fullpath):
+        raise Http404(path)
+
+    statobj = os.stat(fullpath)
+    etag = '"%x-%x"' % (statobj.st_mtime_ns, statobj.st_size)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(statobj.st_mtime)
+    )
+    if response is None:
+        response = media_response(request, path, fullpath, statobj, etag)
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(statobj.st_mtime)
+    response["Accept-Ranges"] = "bytes"
+    if ContentAddressedStorage.is_hashed_name(path):
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=settings.STATIC_HASHED_MAX_AGE,
+            immutable=True,
+        )
+    else:
+        patch_cache_control(response, public=True, max_age=60)
+    return response
+
+
+def metrics(request):
+    """Метрики всех воркеров в текстовом формате Prometheus"""
+    if request.META.get("REMOTE_ADDR") not in settings.METRICS_ALLOWED_IPS:
+        raise Http404
+    return HttpResponse(
+        registry.render(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+def flatpages_version():
+    # Новое значение не совпадёт с версией, вытесненной из кэша
+    return cache.get_or_set(FLATPAGES_VERSION_KEY, time.time_ns, None)
+
+
+def invalidate_flatpages():
+    try:
+        cache.incr(FLATPAGES_VERSION_KEY)
+    except ValueError:
+        cache.set(FLATPAGES_VERSION_KEY, time.time_ns(), None)
+
+
+def get_flatpage(url, site_id, version):
+    key = f"flatpage:{version}:{site_id}:{url}"
+    page = cache.get(key)
+    if page is None:
+        page = FlatPage.objects.filter(url=url, sites=site_id).first()
+        # Отсутствие страницы тоже кэшируем, чтобы 404 не ходили в БД
+        cache.set(key, page or False, FLATPAGE_CACHE_TIMEOUT)
+    return page or None
+
+
+def flatpage(request, url):
+    """Аналог django.contrib.flatpages.views.flatpage, который берёт
+    страницу из кэша, а анонимам отдаёт готовый HTML. Кэш сбрасывается
+    при изменении любой FlatPage
+    """
+    if not url.startswith("/"):
+        url = "/" + url
+    site_id = get_current_site(request).id
+    version = flatpages_version()
+    page = get_flatpage(url, site_id, version)
+    if page is None:
+        if not url.endswith("/") and settings.APPEND_SLASH:
+            if get_flatpage(url + "/", site_id, version) is not None:
+                return HttpResponsePermanentRedirect(f"{request.path}/")
+        raise Http404(url)
+
+    html_key = f"flatpage:html:{version}:{site_id}:{url}"
+    anonymous = not request.user.is_authenticated
+    entry = cache.get(html_key) if anonymous else None
+    if entry is None:
+        response = render_flatpage(request, page)
+        if response.status_code != 200:
+            return response
+        entry = (
+            response.content,
+            '"%s"' % hashlib.md5(response.content).hexdigest(),
+        )
+        if anonymous and not page.registration_required:
+            cache.set(html_key, entry, FLATPAGE_CACHE_TIMEOUT)
+
+    content, etag = entry
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(content)
+    response["ETag"] = etag
+    return response
@@ -1,12 +1,27 @@
 from django.contrib import admin
 
+from core.admin import input_filter
+
 from .models import Post, Group, Comment, Follow
+from .pagination import EstimatedCountPaginator
+
 
+class ScalableAdmin(admin.ModelAdmin):
+    """Список без полного COUNT(*) таблицы на каждый запрос"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
-class PostAdmin (admin.ModelAdmin):
-    list_display = ("pk", "text", "pub_date", "author")
-    search_fields = ("text",) 
-    list_filter = ("pub_date",)
+
+class PostAdmin (ScalableAdmin):
+    list_display = ("pk", "text", "pub_date", "author", "group")
+    list_select_related = ("author", "group")
+    search_fields = ("text",)
+    list_filter = (
+        "pub_date",
+        input_filter("author", "автору", "author__username"),
+    )
+    date_hierarchy = "pub_date"
+    autocomplete_fields = ("author", "group")
     empty_value_display = "-пусто-"
 
 
@@ -16,16 +31,27 @@ class GroupAdmin (admin.ModelAdmin):
     empty_value_display = "-пусто-"
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(ScalableAdmin):
     list_display = ("pk", "post", "author", "text", "created")
+    list_select_related = ("post", "author")
     search_fields = ("text",)
-    list_filter = ("post", "author", "created")
+    list_filter = (
+        input_filter("post", "номеру записи", "post_id"),
+        input_filter("author", "автору", "author__username"),
+    )
+    date_hierarchy = "created"
+    autocomplete_fields = ("post", "author")
     empty_value_display = "-пусто-"
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(ScalableAdmin):
     list_display = ("user", "author")
-    list_filter = ("user", "author")
+    list_select_related = ("user", "author")
+    list_filter = (
+        input_filter("user", "подписчику", "user__username"),
+        input_filter("author", "автору", "author__username"),
+    )
+    autocomplete_fields = ("user", "author")
 
 
 admin.site.register(Post, PostAdmin)
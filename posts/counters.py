@@ -0,0 +1,163 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from core.tasks import enqueue
+
+from .models import Post
+
+
+UPDATE_BATCH = 300
+
+
+class SeenFilter:
+    """Фильтр Блума по парам (посетитель, запись) за окно времени.
+    Ложные срабатывания теряют малую долю просмотров, зато память
+    фиксирована и проверка не ходит ни в кэш, ни в базу
+    """
+
+    def __init__(self, bits, hashes, window):
+        self.size = bits
+        self.hashes = hashes
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self.bits = bytearray((self.size + 7) // 8)
+        self.started = time.monotonic()
+
+    def positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        """Добавляет элемент; False, если он уже (вероятно) был"""
+        if time.monotonic() - self.started > self.window:
+            self.reset()
+        new = False
+        for position in self.positions(item):
+            byte, bit = divmod(position, 8)
+            if not self.bits[byte] & (1 << bit):
+                self.bits[byte] |= 1 << bit
+                new = True
+        return new
+
+
+class ViewBuffer:
+    """Просмотры записей, накопленные в памяти процесса. Раз в
+    VIEWS_FLUSH_INTERVAL секунд буфер уходит в очередь одной задачей,
+    которая прибавляет счётчики всех записей одним UPDATE. Если новых
+    просмотров нет, буфер сбрасывает таймер
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.seen = SeenFilter(
+            settings.VIEWS_DEDUP_BITS,
+            settings.VIEWS_DEDUP_HASHES,
+            settings.VIEWS_DEDUP_WINDOW,
+        )
+        self.flushed_at = time.monotonic()
+        self.timer = None
+
+    def add(self, post_id, visitor):
+        with self.lock:
+            if not self.seen.add(f"{visitor}:{post_id}"):
+                return False
+            self.counts[post_id] = self.counts.get(post_id, 0) + 1
+            due = (
+                time.monotonic() - self.flushed_at
+                >= settings.VIEWS_FLUSH_INTERVAL
+            )
+            if not due and self.timer is None:
+                self.timer = threading.Timer(
+                    settings.VIEWS_FLUSH_INTERVAL, self.flush_idle
+                )
+                self.timer.daemon = True
+                self.timer.start()
+        if due:
+            self.flush()
+        return True
+
+    def pending(self, post_id):
+        return self.counts.get(post_id, 0)
+
+    def drain(self):
+        with self.lock:
+            counts, self.counts = self.counts, {}
+            self.flushed_at = time.monotonic()
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        return counts
+
+    def flush(self):
+        counts = self.drain()
+        if counts:
+            enqueue("posts.flush_views", [sorted(counts.items())])
+        return counts
+
+    def flush_idle(self):
+        # Поток таймера открывает своё соединение с базой
+        try:
+            self.flush()
+        finally:
+            connections.close_all()
+
+
+def visitor_id(request):
+    if request.user.is_authenticated:
+        return f"u{request.user.id}"
+    if request.session.session_key:
+        return f"s{request.session.session_key}"
+    return "a{}:{}".format(
+        request.META.get("REMOTE_ADDR", ""),
+        request.META.get("HTTP_USER_AGENT", ""),
+    )
+
+
+def record_view(request, post):
+    """Засчитывает просмотр записи; на запрос это только операция в
+    памяти процесса
+    """
+    if getattr(request, "prerendering", False):
+        return False
+    return buffer.add(post.id, visitor_id(request))
+
+
+def view_count(post):
+    """Сохранённое число просмотров плюс ещё не сброшенные этим процессом"""
+    return post.views + buffer.pending(post.id)
+
+
+def apply_views(counts):
+    """Прибавляет просмотры к записям в одной транзакции: по UPDATE на
+    каждые UPDATE_BATCH записей, чтобы не упереться в лимит параметров
+    """
+    counts = [(int(post_id), count) for post_id, count in counts if count > 0]
+    updated = 0
+    with transaction.atomic():
+        for start in range(0, len(counts), UPDATE_BATCH):
+            batch = dict(counts[start:start + UPDATE_BATCH])
+            increment = Case(
+                *(When(pk=post_id, then=Value(count))
+                  for post_id, count in batch.items()),
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+            updated += Post.objects.filter(pk__in=batch).update(
+                views=F("views") + increment
+            )
+    return updated
+
+
+# Просмотры за последний интервал теряются при остановке процесса:
+# счётчик и так приблизительный. Таймер не держит процесс при выходе
+buffer = ViewBuffer()
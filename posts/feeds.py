@@ -0,0 +1,185 @@
+import hashlib
+import time
+
+from django.contrib.syndication.views import Feed
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.http import http_date, parse_http_date_safe
+from django.utils.text import Truncator
+
+from core.routers import read_only
+
+from .identity import groups, users
+from .models import Post
+
+
+FEED_ITEMS = 20
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+# Общая версия всех лент: меняется при правке групп и пользователей
+FEEDS_VERSION_KEY = "feeds:version"
+
+
+def version_key(scope):
+    return f"{FEEDS_VERSION_KEY}:{scope}"
+
+
+def feed_versions(scope):
+    keys = [FEEDS_VERSION_KEY, version_key(scope)]
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        # Новое значение не совпадёт с версией, вытесненной из кэша
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def invalidate_feeds(*scopes):
+    keys = [version_key(scope) for scope in scopes] or [FEEDS_VERSION_KEY]
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+class PostFeed(Feed):
+    def items(self, obj):
+        return self.posts(obj).select_related("author")[:FEED_ITEMS]
+
+    def item_title(self, item):
+        return Truncator(item.text).words(10)
+
+    def item_description(self, item):
+        return item.text
+
+    def item_link(self, item):
+        return reverse("post", args=[item.author.username, item.id])
+
+    def item_pubdate(self, item):
+        return item.pub_date
+
+    def item_author_name(self, item):
+        return item.author.get_full_name() or item.author.username
+
+
+class LatestPostsFeed(PostFeed):
+    title = "Yatube: новые записи"
+    description = "Последние записи всех авторов"
+
+    def scope(self):
+        return "site"
+
+    def link(self):
+        return reverse("index")
+
+    def posts(self, obj):
+        return Post.objects.filter(author__is_active=True)
+
+
+class GroupFeed(PostFeed):
+    def scope(self, slug):
+        return f"group:{slug}"
+
+    def get_object(self, request, slug):
+        return groups.get_or_404(slug)
+
+    def title(self, obj):
+        return f"Yatube: {obj.title}"
+
+    def description(self, obj):
+        return obj.description
+
+    def link(self, obj):
+        return reverse("group", args=[obj.slug])
+
+    def posts(self, obj):
+        return obj.posts.filter(author__is_active=True)
+
+
+class AuthorFeed(PostFeed):
+    def scope(self, username):
+        return f"author:{username}"
+
+    def get_object(self, request, username):
+        return users.get_or_404(username, is_active=True)
+
+    def title(self, obj):
+        return f"Yatube: {obj.get_full_name() or obj.username}"
+
+    def description(self, obj):
+        return f"Записи автора {obj.username}"
+
+    def link(self, obj):
+        return reverse("profile", args=[obj.username])
+
+    def posts(self, obj):
+        return obj.posts.all()
+
+
+class LatestPostsAtomFeed(LatestPostsFeed):
+    feed_type = Atom1Feed
+    subtitle = LatestPostsFeed.description
+
+
+class GroupAtomFeed(GroupFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return self.description(obj)
+
+
+class AuthorAtomFeed(AuthorFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return self.description(obj)
+
+
+def cached_feed(feed):
+    """Отдаёт ленту из кэша: тело строится один раз на версию
+    содержимого, а опрос без изменений получает 304 после одного
+    обращения к кэшу за версиями
+    """
+    @read_only
+    def view(request, **kwargs):
+        versions = feed_versions(feed.scope(**kwargs))
+        key = "feed:{}:{}:{}:{}".format(
+            feed.__class__.__name__,
+            ":".join(map(str, versions)),
+            "https" if request.is_secure() else "http",
+            ":".join(kwargs.values()),
+        )
+        entry = cache.get(key)
+        if entry is None:
+            response = feed(request, **kwargs)
+            entry = (
+                response.content,
+                response["Content-Type"],
+                '"%s"' % hashlib.md5(response.content).hexdigest(),
+                parse_http_date_safe(response.get("Last-Modified", "")),
+            )
+            cache.set(key, entry, FEED_CACHE_TIMEOUT)
+
+        content, content_type, etag, last_modified = entry
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = HttpResponse(content, content_type=content_type)
+        response["ETag"] = etag
+        if last_modified:
+            response["Last-Modified"] = http_date(last_modified)
+        return response
+    return view
+
+
+latest_rss = cached_feed(LatestPostsFeed())
+latest_atom = cached_feed(LatestPostsAtomFeed())
+group_rss = cached_feed(GroupFeed())
+group_atom = cached_feed(GroupAtomFeed())
+author_rss = cached_feed(AuthorFeed())
+author_atom = cached_feed(AuthorAtomFeed())
@@ -0,0 +1,17 @@
+from django.contrib.auth import get_user_model
+
+from core.identity import IdentityCache
+
+from .models import Group
+
+
+User = get_user_model()
+
+# Поля, которых хватает страницам автора и группы
+users = IdentityCache(
+    User, "username",
+    ("id", "username", "first_name", "last_name", "is_active"),
+)
+groups = IdentityCache(
+    Group, "slug", ("id", "title", "slug", "description"),
+)
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post, Tag
+
+
+class Command(BaseCommand):
+    help = "Извлекает #теги из уже опубликованных записей пачками"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+
+    def handle(self, *args, **options):
+        last_pk = 0
+        total = 0
+        while True:
+            posts = list(
+                Post.objects.filter(pk__gt=last_pk)
+                .order_by("pk")[:options["batch_size"]]
+            )
+            if not posts:
+                break
+            Tag.objects.link(posts)
+            last_pk = posts[-1].pk
+            total += len(posts)
+        self.stdout.write(f"Обработано записей: {total}")
@@ -0,0 +1,85 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Count
+from django.template import engines
+from django.test import RequestFactory
+
+from posts.models import Comment, Group, Post
+from posts.pagination import POSTS_PER_PAGE
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает время отрисовки главной страницы шаблонами Django и "
+        "Jinja2 на временно созданных записях"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=200)
+        parser.add_argument("--template", default="index.html")
+
+    def handle(self, *args, **options):
+        if "jinja2" not in engines:
+            raise CommandError("Jinja2 не установлен")
+        if settings.DEBUG:
+            self.stderr.write(
+                "DEBUG=True: без кэширующего загрузчика шаблоны Django "
+                "разбираются заново при каждой отрисовке"
+            )
+        with transaction.atomic():
+            context = self.seed()
+            request = RequestFactory().get("/")
+            request.user = AnonymousUser()
+            for engine in ("django", "jinja2"):
+                template = engines[engine].get_template(options["template"])
+                template.render(dict(context), request)
+                timings = []
+                for _ in range(options["repeat"]):
+                    started = time.perf_counter()
+                    template.render(dict(context), request)
+                    timings.append(time.perf_counter() - started)
+                self.stdout.write(
+                    f"{engine}: медиана "
+                    f"{statistics.median(timings) * 1000:.2f} мс, "
+                    f"минимум {min(timings) * 1000:.2f} мс"
+                )
+            transaction.set_rollback(True)
+
+    def seed(self):
+        """Страница ленты из POSTS_PER_PAGE записей с группами, тегами и
+        комментариями; запросы к базе делаются заранее, чтобы мерить
+        только шаблоны
+        """
+        author = User.objects.create_user(username="benchmark_author")
+        group = Group.objects.create(
+            title="Бенчмарк", slug="benchmark", description="Бенчмарк"
+        )
+        for i in range(POSTS_PER_PAGE):
+            post = Post.objects.create(
+                author=author,
+                group=group if i % 2 else None,
+                text=f"Запись {i} #бенчмарк\nВторая строка <b>текста</b>",
+            )
+            Comment.objects.create(post=post, author=author, text="!")
+        posts = list(
+            Post.objects.filter(author=author)
+            .select_related("author", "group")
+            .annotate(comment_count=Count("comments"))
+        )
+        # Середина длинной ленты: отрисовывается и переключатель страниц
+        paginator = Paginator(posts * 20, POSTS_PER_PAGE)
+        return {
+            "page": paginator.page(10),
+            "paginator": paginator,
+            "follow": False,
+        }
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from posts.sitemaps import build_sitemaps
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересобирает изменившиеся файлы карты сайта (записи, профили, "
+        "группы) и индекс sitemap.xml"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Пересобрать все файлы, например после смены имён",
+        )
+        parser.add_argument("--shard-size", type=int)
+
+    def handle(self, *args, **options):
+        written = build_sitemaps(
+            force=options["force"],
+            shard_size=options["shard_size"],
+        )
+        self.stdout.write(f"Обновлено файлов: {len(written)}")
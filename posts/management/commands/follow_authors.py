@@ -0,0 +1,37 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.models import Follow
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Подписывает (или отписывает) пользователя на список авторов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("username")
+        parser.add_argument("authors", nargs="+")
+        parser.add_argument(
+            "--unfollow",
+            action="store_true",
+            help="Отписать пользователя от перечисленных авторов",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["username"])
+        except User.DoesNotExist:
+            raise CommandError(
+                f"Пользователь {options['username']} не найден"
+            )
+        author_ids = list(User.objects.filter(
+            username__in=options["authors"]
+        ).values_list("id", flat=True))
+        if options["unfollow"]:
+            deleted, _ = Follow.objects.unfollow(user, author_ids)
+            self.stdout.write(f"Удалено подписок: {deleted}")
+        else:
+            Follow.objects.follow(user, author_ids)
+            self.stdout.write(f"Обработано авторов: {len(author_ids)}")
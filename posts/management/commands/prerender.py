@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts.prerender import render_all
+
+
+class Command(BaseCommand):
+    help = (
+        "Рисует заново все страницы ленты, групп, профилей и записей "
+        "для анонимных посетителей и удаляет файлы пропавших страниц"
+    )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Записано страниц: {render_all()}")
@@ -0,0 +1,47 @@
+import os
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from core.views import send_media_file
+
+from .counters import buffer, visitor_id
+from .prerender import page_name, page_path, prerendered_match
+
+
+class PrerenderedPageMiddleware:
+    """Отдаёт анонимным посетителям готовые файлы ленты, групп, профилей
+    и записей (см. posts.prerender), не вызывая view. Файл отдаётся
+    как медиа, поэтому при MEDIA_SENDFILE его читает фронтенд-сервер
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = None
+        if (
+            settings.PRERENDER_ENABLED
+            and request.method in ("GET", "HEAD")
+            and not request.GET
+            and not request.user.is_authenticated
+        ):
+            response = self.prerendered(request)
+        if response is None:
+            response = self.get_response(request)
+        return response
+
+    def prerendered(self, request):
+        name = page_name(request.path_info)
+        if name is None:
+            return None
+        match = prerendered_match(request.path_info)
+        if match is None or not os.path.isfile(page_path(name)):
+            return None
+        if match.url_name == "post":
+            buffer.add(match.kwargs["post_id"], visitor_id(request))
+        response = send_media_file(request, name)
+        response["Content-Type"] = "text/html; charset=utf-8"
+        # Вошедшим пользователям та же страница рисуется иначе
+        patch_vary_headers(response, ("Cookie",))
+        return response
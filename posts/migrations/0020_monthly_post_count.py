@@ -0,0 +1,64 @@
+# Generated by Django 2.2.6 on 2026-10-19 07:47
+
+from collections import Counter
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_monthly_counts(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    MonthlyPostCount = apps.get_model('posts', 'MonthlyPostCount')
+    counts = Counter()
+    posts = Post.objects.values_list('pub_date', 'author_id', 'group_id')
+    for pub_date, author_id, group_id in posts.iterator():
+        month = timezone.localtime(pub_date).date().replace(day=1)
+        counts['site', 0, month] += 1
+        counts['author', author_id, month] += 1
+        if group_id:
+            counts['group', group_id, month] += 1
+    MonthlyPostCount.objects.bulk_create(
+        MonthlyPostCount(scope=scope, object_id=object_id, month=month, count=count)
+        for (scope, object_id, month), count in counts.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_auto_20201115_1932'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyPostCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('site', 'Сайт'), ('group', 'Группа'), ('author', 'Автор')], max_length=10)),
+                ('object_id', models.PositiveIntegerField(default=0)),
+                ('month', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ('-month',),
+            },
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='pub_date',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата публикации'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', 'pub_date'], name='posts_post_group_i_5ba9fa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', 'pub_date'], name='posts_post_author__b65dbb_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='monthlypostcount',
+            constraint=models.UniqueConstraint(fields=('scope', 'object_id', 'month'), name='scope_object_month'),
+        ),
+        migrations.RunPython(fill_monthly_counts, migrations.RunPython.noop),
+    ]
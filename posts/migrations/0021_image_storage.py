@@ -0,0 +1,36 @@
+# Generated by Django 2.2.6 on 2026-10-19 07:55
+
+from collections import Counter
+
+import core.storage
+from django.db import migrations, models
+
+
+def fill_blobs(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Blob = apps.get_model('core', 'Blob')
+    counts = Counter(
+        Post.objects.exclude(image='').exclude(image__isnull=True)
+        .values_list('image', flat=True).iterator()
+    )
+    Blob.objects.bulk_create(
+        Blob(name=name, refcount=refcount)
+        for name, refcount in counts.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_blob'),
+        ('posts', '0020_monthly_post_count'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.ContentAddressedStorage(), upload_to='posts/'),
+        ),
+        migrations.RunPython(fill_blobs, migrations.RunPython.noop),
+    ]
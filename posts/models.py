@@ -1,5 +1,11 @@
-from django.db import models
+import re
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from core.storage import ContentAddressedStorage
 
 
 User = get_user_model()
@@ -16,7 +22,11 @@ class Group(models.Model):
 
 class Post(models.Model):
     text = models.TextField()
-    pub_date = models.DateTimeField("Дата публикации", auto_now_add=True)
+    pub_date = models.DateTimeField(
+        "Дата публикации",
+        auto_now_add=True,
+        db_index=True,
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -31,12 +41,24 @@ class Post(models.Model):
     )
     image = models.ImageField(
         upload_to="posts/",
+        storage=ContentAddressedStorage(),
         blank=True,
         null=True
     )
+    # Сохранённое число лайков; свежие лайки копятся в кэше и
+    # переносятся сюда пачками (см. posts.reactions)
+    likes = models.PositiveIntegerField(default=0)
+    # Просмотры копятся в памяти процесса и прибавляются пачками
+    # (см. posts.counters)
+    views = models.PositiveIntegerField("Просмотры", default=0)
     
     class Meta:
         ordering = ("-pub_date",)
+        indexes = [
+            models.Index(fields=["group", "pub_date"]),
+            models.Index(fields=["author", "pub_date"]),
+            models.Index(fields=["author", "views"]),
+        ]
 
     def __str__(self):
         return self.text 
@@ -54,12 +76,69 @@ class Comment(models.Model):
         related_name="authors"
     )
     text = models.TextField(max_length=280)
-    created = models.DateTimeField(auto_now_add=True)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
 
     class Meta:
         ordering = ("-created",)
 
 
+class Like(models.Model):
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name="like_set",
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="likes",
+    )
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=[
+                    "post",
+                    "user",
+                ], name="post_user_like"
+            )
+        ]
+
+
+class LikeEvent(models.Model):
+    """Лайк или его отмена, ещё не перенесённые в Like и Post.likes.
+    Таблица только пополняется; задача сброса забирает и удаляет строки
+    """
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    liked = models.BooleanField()
+
+
+class FollowQuerySet(models.QuerySet):
+    def follow(self, user, author_ids):
+        """Подписывает user на авторов одним INSERT, повторы отбрасывает
+        уникальное ограничение user_author
+        """
+        follows = [
+            self.model(user=user, author_id=author_id)
+            for author_id in set(author_ids) if author_id != user.id
+        ]
+        return self.bulk_create(follows, ignore_conflicts=True)
+
+    def unfollow(self, user, author_ids):
+        """Отписывает user от авторов одним DELETE"""
+        return self.filter(user=user, author_id__in=author_ids).delete()
+
+
 class Follow(models.Model):
     user = models.ForeignKey(
         User,
@@ -71,7 +150,9 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name="following",
     )
-    
+
+    objects = FollowQuerySet.as_manager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -81,3 +162,144 @@ class Follow(models.Model):
                 ], name="user_author"
             )
         ]
+
+
+def month_start(value):
+    return timezone.localtime(value).date().replace(day=1)
+
+
+class MonthlyPostCountQuerySet(models.QuerySet):
+    def add(self, scope, object_id, month, delta):
+        """Атомарно меняет счётчик месяца на delta, создавая строку при
+        необходимости
+        """
+        lookup = {"scope": scope, "object_id": object_id, "month": month}
+        if self.filter(**lookup).update(count=F("count") + delta):
+            return
+        if delta < 0:
+            return
+        try:
+            with transaction.atomic():
+                self.create(count=delta, **lookup)
+        except IntegrityError:
+            self.filter(**lookup).update(count=F("count") + delta)
+
+    def add_post(self, post, delta, group_id=None):
+        month = month_start(post.pub_date)
+        self.add(self.model.SITE, 0, month, delta)
+        self.add(self.model.AUTHOR, post.author_id, month, delta)
+        if group_id:
+            self.add(self.model.GROUP, group_id, month, delta)
+
+    def move_group(self, post, old_group_id, new_group_id):
+        month = month_start(post.pub_date)
+        if old_group_id:
+            self.add(self.model.GROUP, old_group_id, month, -1)
+        if new_group_id:
+            self.add(self.model.GROUP, new_group_id, month, 1)
+
+    def for_scope(self, scope, object_id=0):
+        return self.filter(scope=scope, object_id=object_id, count__gt=0)
+
+
+class MonthlyPostCount(models.Model):
+    """Число постов за месяц по всему сайту, группе или автору, которое
+    поддерживается сигналами Post и нужно для навигации по архиву
+    """
+    SITE = "site"
+    GROUP = "group"
+    AUTHOR = "author"
+    SCOPES = (
+        (SITE, "Сайт"),
+        (GROUP, "Группа"),
+        (AUTHOR, "Автор"),
+    )
+
+    scope = models.CharField(max_length=10, choices=SCOPES)
+    object_id = models.PositiveIntegerField(default=0)
+    month = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+
+    objects = MonthlyPostCountQuerySet.as_manager()
+
+    class Meta:
+        ordering = ("-month",)
+        constraints = [
+            models.UniqueConstraint(
+                fields=[
+                    "scope",
+                    "object_id",
+                    "month",
+                ], name="scope_object_month"
+            )
+        ]
+
+
+# Тег — слово после #, не часть другого слова или HTML-сущности (&#39;)
+TAG_RE = re.compile(r"(?<![\w&])#(\w{1,50})\b")
+
+
+def extract_tags(text):
+    return {name.lower() for name in TAG_RE.findall(text or "")}
+
+
+class TagQuerySet(models.QuerySet):
+    def link(self, posts):
+        """Заново привязывает к записям теги из их текста: несколько
+        запросов на всю пачку, а не на каждую запись
+        """
+        names = {post.pk: extract_tags(post.text) for post in posts}
+        all_names = set().union(*names.values())
+        self.bulk_create(
+            [self.model(name=name) for name in all_names],
+            ignore_conflicts=True,
+        )
+        tag_ids = dict(
+            self.filter(name__in=all_names).values_list("name", "id")
+        )
+        with transaction.atomic():
+            PostTag.objects.filter(post_id__in=names).delete()
+            PostTag.objects.bulk_create(
+                PostTag(post_id=post.pk, tag_id=tag_ids[name],
+                        pub_date=post.pub_date)
+                for post in posts for name in names[post.pk]
+            )
+
+
+class Tag(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+
+    objects = TagQuerySet.as_manager()
+
+    def __str__(self):
+        return f"#{self.name}"
+
+
+class PostTag(models.Model):
+    """Связь записи с тегом. pub_date скопирована из записи, чтобы лента
+    тега читалась по индексу (tag, pub_date) без соединения с Post
+    """
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name="tag_links",
+    )
+    tag = models.ForeignKey(
+        Tag,
+        on_delete=models.CASCADE,
+        related_name="post_links",
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["tag", "pub_date"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=[
+                    "post",
+                    "tag",
+                ], name="post_tag"
+            )
+        ]
@@ -0,0 +1,127 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+
+POSTS_PER_PAGE = 10
+COUNT_KEY = "post_count:{}"
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# Ключ больше BIGINT не помещается в параметр запроса
+MAX_CURSOR_PK = 2 ** 63 - 1
+
+
+def refresh_count(key, object_list):
+    count = object_list.count()
+    cache.set(COUNT_KEY.format(key), (count, time.time()), None)
+    return count
+
+
+def refresh_count_in_background(key, object_list):
+    # Один пересчёт на ключ, пока предыдущий не закончился
+    if not cache.add(COUNT_KEY.format(key) + ":lock", 1, 60):
+        return
+
+    def run():
+        try:
+            refresh_count(key, object_list)
+        finally:
+            cache.delete(COUNT_KEY.format(key) + ":lock")
+            connections.close_all()
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def forget_counts(*keys):
+    """Сбрасывает оценки: следующий запрос посчитает число точно"""
+    cache.delete_many([COUNT_KEY.format(key) for key in keys])
+
+
+def estimated_count(key, object_list):
+    """Закэшированное число объектов; устаревшее значение отдаётся как
+    есть, а точное пересчитывается в фоне
+    """
+    entry = cache.get(COUNT_KEY.format(key))
+    if entry is None:
+        return None
+    count, counted_at = entry
+    if time.time() - counted_at > settings.PAGINATOR_COUNT_TTL:
+        refresh_count_in_background(key, object_list)
+    return count
+
+
+def is_inner_page(number, num_pages):
+    try:
+        return 1 <= int(number or 1) < num_pages
+    except (TypeError, ValueError):
+        return False
+
+
+def paginate(request, object_list, count_key, per_page=POSTS_PER_PAGE):
+    """Paginator и страница из ?page=N без точного COUNT(*) на каждый
+    запрос. Оценка используется только для внутренних страниц, которые
+    заведомо заполнены целиком; для последней страницы, номеров за её
+    пределами и внутренней страницы, оказавшейся пустой (объекты
+    удалили в обход сигналов), число объектов считается точно
+    """
+    number = request.GET.get("page")
+    paginator = Paginator(object_list, per_page)
+    count = estimated_count(count_key, object_list)
+    if count is not None:
+        paginator.count = count
+        if is_inner_page(number, paginator.num_pages):
+            page = paginator.get_page(number)
+            if page.object_list:
+                return paginator, page
+        paginator = Paginator(object_list, per_page)
+    page = paginator.get_page(number)
+    cache.set(COUNT_KEY.format(count_key), (paginator.count, time.time()), None)
+    return paginator, page
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator для админки: число строк всей таблицы берётся из
+    кэша (см. estimated_count), отфильтрованный список считается точно
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, "query", None)
+        if query is None or query.where:
+            return super().count
+        key = f"admin:{self.object_list.model._meta.label_lower}"
+        count = estimated_count(key, self.object_list)
+        if count is None:
+            count = refresh_count(key, self.object_list)
+        return count
+
+
+def encode_cursor(pub_date, pk):
+    """Позиция в ленте, упорядоченной по (-pub_date, -pk): дата в
+    микросекундах от эпохи и ключ последней показанной записи
+    """
+    return f"{(pub_date - EPOCH) // timedelta(microseconds=1)}.{pk}"
+
+
+def decode_cursor(value):
+    """Разбирает курсор из encode_cursor. Испорченный курсор, дата за
+    пределами datetime или ключ больше BIGINT дают None: лента
+    откроется с первой страницы
+    """
+    microseconds, _, pk = (value or "").partition(".")
+    if not (microseconds.isdigit() and pk.isdigit()):
+        return None
+    try:
+        pub_date = EPOCH + timedelta(microseconds=int(microseconds))
+        pk = int(pk)
+    except (OverflowError, ValueError):
+        return None
+    if pk > MAX_CURSOR_PK:
+        return None
+    return pub_date, pk
@@ -0,0 +1,196 @@
+import inspect
+import os
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.http import Http404, HttpRequest
+from django.urls import Resolver404, resolve, reverse
+
+from core.tasks import enqueue
+
+from .models import Group, Post
+from .sitemaps import write_atomic
+
+
+User = get_user_model()
+
+# Страницы, которые анонимные посетители получают готовыми файлами
+PRERENDERED_VIEWS = {"index", "group", "profile", "post"}
+
+
+def page_name(path):
+    """Имя файла страницы относительно MEDIA_ROOT. Адреса со слешем на
+    конце и без него (/group/<slug> и /<username>/<id>/) не совпадут
+    """
+    rel = path.strip("/")
+    if rel and any(part in ("", ".", "..") for part in rel.split("/")):
+        return None
+    if not rel:
+        name = "index.html"
+    elif path.endswith("/"):
+        name = f"{rel}/index.html"
+    else:
+        name = f"{rel}.html"
+    return f"{settings.PRERENDER_DIR}/{name}"
+
+
+def page_path(name):
+    return os.path.join(settings.MEDIA_ROOT, *name.split("/"))
+
+
+def prerendered_match(path):
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return None
+    if match.url_name not in PRERENDERED_VIEWS:
+        return None
+    return match
+
+
+def render_page(path):
+    """Рисует страницу для анонимного посетителя и сохраняет файл;
+    если страницы больше нет, удаляет его. Возвращает True, если файл
+    записан
+    """
+    name = page_name(path)
+    match = prerendered_match(path)
+    if name is None or match is None:
+        return False
+    request = HttpRequest()
+    request.method = "GET"
+    request.path = request.path_info = path
+    request.user = AnonymousUser()
+    request.prerendering = True
+    # Без cache_page и read_only: страница не должна прийти из кэша
+    # или с отстающей реплики
+    view = inspect.unwrap(match.func)
+    try:
+        response = view(request, *match.args, **match.kwargs)
+    except Http404:
+        response = None
+    fullpath = page_path(name)
+    if response is None or response.status_code != 200:
+        if os.path.exists(fullpath):
+            os.remove(fullpath)
+        return False
+    directory = os.path.dirname(fullpath)
+    os.makedirs(directory, exist_ok=True)
+    write_atomic(directory, os.path.basename(fullpath), [
+        response.content.decode(response.charset)
+    ])
+    return True
+
+
+def user_pages(username):
+    """Профиль и уже готовые страницы записей пользователя"""
+    paths = [reverse("profile", args=[username])]
+    name = page_name(f"/{username}/")
+    if name is None:
+        return paths
+    directory = os.path.dirname(page_path(name))
+    if os.path.isdir(directory):
+        paths.extend(
+            reverse("post", args=[username, int(entry)])
+            for entry in sorted(os.listdir(directory))
+            if entry.isdigit()
+        )
+    return paths
+
+
+def render_user_pages(username):
+    for path in user_pages(username):
+        render_page(path)
+
+
+def schedule(*paths):
+    """Ставит в очередь перерисовку страниц; пока задача для адреса
+    ждёт в очереди, повторные изменения её не дублируют
+    """
+    if not settings.PRERENDER_ENABLED:
+        return
+    for path in set(paths):
+        enqueue(
+            "posts.prerender_page", [path], dedup_key=f"prerender:{path}"
+        )
+
+
+def schedule_users(*usernames):
+    """Перерисовка профиля и страниц записей: на них видно имя автора"""
+    if not settings.PRERENDER_ENABLED:
+        return
+    for username in set(usernames):
+        enqueue(
+            "posts.prerender_user", [username],
+            dedup_key=f"prerender_user:{username}",
+        )
+
+
+def schedule_profiles(*usernames):
+    """Перерисовка одних профилей: готовые страницы записей счётчиков
+    подписок и записей не показывают
+    """
+    schedule(*(reverse("profile", args=[username]) for username in usernames))
+
+
+def post_pages(post, group_ids=()):
+    """Страницы, на которых видна запись: лента, профиль, группы
+    (текущая и прежняя) и сама запись
+    """
+    username = post.author.username
+    slugs = Group.objects.filter(
+        pk__in=set(group_ids) - {None}
+    ).values_list("slug", flat=True)
+    return [
+        reverse("index"),
+        reverse("profile", args=[username]),
+        reverse("post", args=[username, post.pk]),
+        *(reverse("group", args=[slug]) for slug in slugs),
+    ]
+
+
+def posts_pages(rows):
+    """Страницы, на которых видны записи, по тройкам (pk записи, имя
+    автора, слаг группы или None)
+    """
+    paths = {reverse("index")}
+    for pk, username, slug in rows:
+        paths.add(reverse("profile", args=[username]))
+        paths.add(reverse("post", args=[username, pk]))
+        if slug:
+            paths.add(reverse("group", args=[slug]))
+    return paths
+
+
+def render_all():
+    """Рисует все страницы заново и удаляет файлы страниц, которых
+    больше нет. Возвращает число записанных файлов
+    """
+    paths = [reverse("index")]
+    paths.extend(
+        reverse("group", args=[slug])
+        for slug in Group.objects.values_list("slug", flat=True)
+    )
+    paths.extend(
+        reverse("profile", args=[username])
+        for username in User.objects.filter(
+            is_active=True
+        ).values_list("username", flat=True).iterator()
+    )
+    paths.extend(
+        reverse("post", args=[username, pk])
+        for pk, username in Post.objects.filter(
+            author__is_active=True
+        ).values_list("pk", "author__username").iterator()
+    )
+    written = {
+        page_path(page_name(path)) for path in paths if render_page(path)
+    }
+    root = os.path.join(settings.MEDIA_ROOT, settings.PRERENDER_DIR)
+    for directory, _, files in os.walk(root):
+        for filename in files:
+            fullpath = os.path.join(directory, filename)
+            if fullpath not in written:
+                os.remove(fullpath)
+    return len(written)
@@ -0,0 +1,202 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from core.cache import shared_cache
+from core.tasks import enqueue
+
+from .models import Like, LikeEvent, Post, User
+
+
+# Состояние лайка пользователя хранится со смещением: memcached не
+# уменьшает счётчик ниже нуля
+NOT_LIKED = 1
+LIKED = 2
+
+STATE_KEY = "likes:state:{}:{}"
+FLUSH_LOCK_KEY = "likes:flush:lock"
+SCHEDULED_KEY = "likes:flush:scheduled"
+EVENTS_PER_BATCH = 500
+# Состояние восстанавливается из базы, поэтому ключи не копятся вечно
+STATE_TIMEOUT = 60 * 60 * 24
+
+
+def incr(key, delta=1, initial=0):
+    shared_cache.add(key, initial, STATE_TIMEOUT)
+    try:
+        return shared_cache.incr(key, delta)
+    except ValueError:
+        # Ключ вытеснен между add и incr
+        shared_cache.set(key, initial + delta, STATE_TIMEOUT)
+        return initial + delta
+
+
+def decr(key, delta=1):
+    try:
+        return shared_cache.decr(key, delta)
+    except ValueError:
+        return None
+
+
+def is_liked(post_id, user_id):
+    """Состояние по базе: последнее несброшенное событие, а если его
+    нет — строка Like
+    """
+    last = LikeEvent.objects.filter(
+        post_id=post_id, user_id=user_id
+    ).order_by("-pk").values_list("liked", flat=True).first()
+    if last is not None:
+        return last
+    return Like.objects.filter(post_id=post_id, user_id=user_id).exists()
+
+
+def state_key(post_id, user_id):
+    key = STATE_KEY.format(post_id, user_id)
+    if shared_cache.get(key) is None:
+        liked = is_liked(post_id, user_id)
+        shared_cache.add(key, LIKED if liked else NOT_LIKED, STATE_TIMEOUT)
+    return key
+
+
+def record(post_id, user_id, liked):
+    # Событие пишется в таблицу, а не в кэш: кэш может его вытеснить
+    LikeEvent.objects.create(post_id=post_id, user_id=user_id, liked=liked)
+    # Задача сброса ставится в очередь не чаще раза за интервал, иначе
+    # каждый клик снова писал бы в очередь
+    interval = settings.LIKES_FLUSH_INTERVAL
+    if shared_cache.add(SCHEDULED_KEY, 1, interval):
+        schedule_flush()
+
+
+def schedule_flush():
+    enqueue(
+        "posts.flush_likes",
+        dedup_key="flush_likes",
+        run_at=timezone.now() + timedelta(
+            seconds=settings.LIKES_FLUSH_INTERVAL
+        ),
+    )
+
+
+def toggle_like(post_id, user_id):
+    """Ставит или снимает лайк, дописывая событие в LikeEvent; строки
+    Like и счётчик Post.likes не трогаются до сброса. Переход состояния
+    делается атомарным incr/decr в общем кэше, поэтому двойной клик не
+    засчитается дважды. Возвращает True, если лайк поставлен
+    """
+    key = state_key(post_id, user_id)
+    if incr(key, initial=NOT_LIKED) == LIKED:
+        record(post_id, user_id, True)
+        return True
+    decr(key)
+    if decr(key) == NOT_LIKED:
+        record(post_id, user_id, False)
+        return False
+    incr(key, initial=NOT_LIKED)
+    return True
+
+
+def like_counts(posts):
+    """Число лайков записей: сохранённое в Post.likes плюс ещё не
+    перенесённые в базу события. Один запрос на все записи
+    """
+    posts = list(posts)
+    if not posts:
+        return {}
+    pending = LikeEvent.objects.filter(
+        post__in=[post.pk for post in posts]
+    ).values("post").annotate(
+        added=Count("pk", filter=Q(liked=True)),
+        removed=Count("pk", filter=Q(liked=False)),
+    ).values_list("post", "added", "removed")
+    delta = {post_id: added - removed for post_id, added, removed in pending}
+    return {
+        post.pk: max(post.likes + delta.get(post.pk, 0), 0)
+        for post in posts
+    }
+
+
+def attach_like_counts(posts):
+    """Считает лайки записей страницы одним запросом и кладёт их в
+    post.like_count, откуда их берёт фильтр likes. Возвращает список
+    """
+    posts = list(posts)
+    for post, count in zip(posts, like_counts(posts).values()):
+        post.like_count = count
+    return posts
+
+
+def apply_events(events):
+    """Переносит события в базу: строки Like вставляются и удаляются
+    пачкой, а Post.likes пересчитывается одним UPDATE на все записи
+    """
+    final = {}
+    for event in events:
+        final[event.post_id, event.user_id] = event.liked
+    # Запись или пользователь могли быть удалены, пока лайк ждал сброса
+    post_ids = set(Post.objects.filter(
+        pk__in={post_id for post_id, _ in final}
+    ).values_list("pk", flat=True))
+    user_ids = set(User.objects.filter(
+        pk__in={user_id for _, user_id in final}
+    ).values_list("pk", flat=True))
+    added = []
+    removed = defaultdict(list)
+    for (post_id, user_id), liked in final.items():
+        if post_id not in post_ids or user_id not in user_ids:
+            continue
+        if liked:
+            added.append(Like(post_id=post_id, user_id=user_id))
+        else:
+            removed[post_id].append(user_id)
+    Like.objects.bulk_create(added, ignore_conflicts=True)
+    if removed:
+        condition = Q()
+        for post_id, users in removed.items():
+            condition |= Q(post_id=post_id, user_id__in=users)
+        Like.objects.filter(condition).delete()
+    recount(post_ids)
+
+
+def recount(post_ids):
+    """Пересчитывает Post.likes у записей одним UPDATE"""
+    likes = Like.objects.filter(post=OuterRef("pk")).values(
+        "post"
+    ).annotate(total=Count("pk")).values("total")
+    Post.objects.filter(pk__in=post_ids).update(
+        likes=Coalesce(Subquery(likes), 0)
+    )
+
+
+def flush():
+    """Переносит события пачками. События пачки удаляются в той же
+    транзакции, в которой пересчитан Post.likes, поэтому like_counts не
+    посчитает лайк дважды
+    """
+    if not shared_cache.add(FLUSH_LOCK_KEY, 1, 60):
+        return 0
+    flushed = 0
+    try:
+        while True:
+            with transaction.atomic():
+                events = list(
+                    LikeEvent.objects.order_by("pk")[:EVENTS_PER_BATCH]
+                )
+                if not events:
+                    break
+                apply_events(events)
+                LikeEvent.objects.filter(
+                    pk__in=[event.pk for event in events]
+                ).delete()
+            flushed += len(events)
+    finally:
+        shared_cache.delete(FLUSH_LOCK_KEY)
+    # Лайки, пришедшие после последней пачки, ждут следующего сброса
+    if LikeEvent.objects.exists():
+        schedule_flush()
+    return flushed
@@ -0,0 +1,207 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.urls import reverse
+
+from core.models import Blob
+
+from .feeds import invalidate_feeds
+from .identity import groups, users
+from .models import Comment, Group, MonthlyPostCount, Post, Tag
+from .pagination import forget_counts
+from .prerender import post_pages, schedule, schedule_users
+
+
+User = get_user_model()
+
+IDENTITIES = {User: users, Group: groups}
+
+
+def image_name(instance):
+    # Берём значение из __dict__, чтобы не загружать отложенное поле
+    image = instance.__dict__.get("image")
+    return getattr(image, "name", image) or None
+
+
+@receiver(post_init, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    instance._saved_group_id = instance.group_id
+    instance._saved_image = image_name(instance)
+    instance._saved_text = instance.__dict__.get("text")
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Выполняется раньше обработчиков ниже, которые обновляют _saved_*
+    group_ids = {instance.group_id, instance._saved_group_id}
+    slugs = Group.objects.filter(pk__in=group_ids - {None}).values_list(
+        "slug", flat=True
+    )
+    invalidate_feeds(
+        "site",
+        f"author:{instance.author.username}",
+        *(f"group:{slug}" for slug in slugs),
+    )
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def prerender_post_pages(sender, instance, raw=False, **kwargs):
+    # post_pages загружает автора и группы, поэтому настройка
+    # проверяется до него, а не только в schedule
+    if raw or not settings.PRERENDER_ENABLED:
+        return
+    schedule(*post_pages(
+        instance, {instance.group_id, instance._saved_group_id}
+    ))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def prerender_comment_pages(sender, instance, raw=False, **kwargs):
+    if raw or not settings.PRERENDER_ENABLED:
+        return
+    schedule(*post_pages(instance.post))
+
+
+def forget_post_counts(post):
+    """Число записей в профиле и лентах снова посчитается точно"""
+    group_ids = {post.group_id, post._saved_group_id} - {None}
+    forget_counts(
+        "index",
+        f"profile:{post.author_id}",
+        *(f"group:{group_id}" for group_id in group_ids),
+    )
+
+
+@receiver(post_save, sender=Post)
+def forget_saved_post_counts(sender, instance, created, raw=False,
+                             **kwargs):
+    # Правка без переноса в другую группу число записей не меняет
+    if raw or not created and instance.group_id == instance._saved_group_id:
+        return
+    forget_post_counts(instance)
+
+
+@receiver(post_delete, sender=Post)
+def forget_deleted_post_counts(sender, instance, **kwargs):
+    forget_post_counts(instance)
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        MonthlyPostCount.objects.add_post(instance, 1, instance.group_id)
+    elif instance._saved_group_id != instance.group_id:
+        MonthlyPostCount.objects.move_group(
+            instance, instance._saved_group_id, instance.group_id
+        )
+    instance._saved_group_id = instance.group_id
+
+
+@receiver(post_save, sender=Post)
+def count_image_refs(sender, instance, raw=False, update_fields=None,
+                     **kwargs):
+    if raw or "image" not in instance.__dict__:
+        return
+    if update_fields is not None and "image" not in update_fields:
+        return
+    name = image_name(instance)
+    if name == instance._saved_image:
+        return
+    if name:
+        Blob.objects.acquire(name)
+    if instance._saved_image:
+        Blob.objects.release(instance._saved_image)
+    instance._saved_image = name
+
+
+@receiver(post_save, sender=Post)
+def link_tags(sender, instance, created, raw=False, **kwargs):
+    if raw or "text" not in instance.__dict__:
+        return
+    if created or instance.text != instance._saved_text:
+        Tag.objects.link([instance])
+    instance._saved_text = instance.text
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    MonthlyPostCount.objects.add_post(instance, -1, instance._saved_group_id)
+    if instance._saved_image:
+        Blob.objects.release(instance._saved_image)
+
+
+@receiver(post_delete, sender=Group)
+def drop_group_counts(sender, instance, **kwargs):
+    MonthlyPostCount.objects.filter(
+        scope=MonthlyPostCount.GROUP,
+        object_id=instance.pk,
+    ).delete()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_all_feeds(sender, raw=False, **kwargs):
+    if not raw:
+        invalidate_feeds()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_author_feeds(sender, instance, raw=False, update_fields=None,
+                            **kwargs):
+    # Вход пользователя обновляет только last_login, ленты не меняются
+    if raw or update_fields == frozenset(["last_login"]):
+        return
+    if update_fields and "is_active" in update_fields:
+        # Записи отключённого аккаунта пропадают из всех лент сразу
+        invalidate_feeds()
+        return
+    invalidate_feeds(f"author:{instance.username}")
+
+
+@receiver(post_init, sender=User)
+@receiver(post_init, sender=Group)
+def remember_identity(sender, instance, **kwargs):
+    instance._saved_identity = IDENTITIES[sender].snapshot(instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Group)
+def invalidate_identity(sender, instance, created, raw=False, **kwargs):
+    # Новой строки в кэше нет: ненайденные ключи не кэшируются. Вход
+    # пользователя меняет только last_login и кэш тоже не сбрасывает
+    identity_cache = IDENTITIES[sender]
+    identity = identity_cache.snapshot(instance)
+    if raw or not created and identity != instance._saved_identity:
+        identity_cache.invalidate()
+    instance._saved_identity = identity
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Group)
+def invalidate_deleted_identity(sender, **kwargs):
+    IDENTITIES[sender].invalidate()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def prerender_group_pages(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule(reverse("index"), reverse("group", args=[instance.slug]))
+
+
+@receiver(post_save, sender=User)
+def prerender_user_pages(sender, instance, raw=False, update_fields=None,
+                         **kwargs):
+    if raw or update_fields == frozenset(["last_login"]):
+        return
+    schedule(reverse("index"))
+    schedule_users(instance.username)
@@ -0,0 +1,185 @@
+import json
+import os
+import tempfile
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sites.models import Site
+from django.db.models import Count, Max, Sum
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Group, Post
+
+
+User = get_user_model()
+
+SITEMAP_NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+INDEX_NAME = "sitemap.xml"
+MANIFEST_NAME = "manifest.json"
+
+
+class Section:
+    """Группа однотипных адресов карты сайта. Строки читаются потоком
+    диапазонами первичного ключа, по shard_size ключей на файл
+    """
+
+    def __init__(self, name, queryset, location, lastmod=None,
+                 fingerprint=None):
+        self.name = name
+        self.queryset = queryset
+        self.location = location
+        self.lastmod = lastmod
+        self.fingerprint = {
+            "count": Count("pk"),
+            "pk_sum": Sum("pk"),
+            **(fingerprint or {}),
+        }
+
+    def shards(self, shard_size):
+        last_pk = self.queryset.aggregate(last=Max("pk"))["last"] or 0
+        for number in range((last_pk + shard_size - 1) // shard_size):
+            yield f"sitemap-{self.name}-{number}.xml", (
+                number * shard_size, (number + 1) * shard_size
+            )
+
+    def rows(self, pk_range):
+        start, stop = pk_range
+        return self.queryset.filter(pk__gt=start, pk__lte=stop)
+
+    def shard_fingerprint(self, pk_range):
+        """Дешёвый агрегат по диапазону: меняется при добавлении,
+        удалении или переносе строк, и тогда файл пересобирается
+        """
+        values = self.rows(pk_range).aggregate(**self.fingerprint)
+        return json.loads(json.dumps(values, sort_keys=True, default=str))
+
+    def urls(self, pk_range):
+        rows = self.rows(pk_range).order_by("pk").iterator(chunk_size=2000)
+        for row in rows:
+            lastmod = self.lastmod(row) if self.lastmod else None
+            yield self.location(row), lastmod
+
+
+SECTIONS = (
+    Section(
+        "posts",
+        Post.objects.values_list("pk", "author__username", "pub_date"),
+        lambda row: reverse("post", args=[row[1], row[0]]),
+        lastmod=lambda row: row[2],
+        fingerprint={
+            "last_pub_date": Max("pub_date"),
+            "author_sum": Sum("author_id"),
+        },
+    ),
+    Section(
+        "profiles",
+        User.objects.filter(is_active=True).values_list("pk", "username"),
+        lambda row: reverse("profile", args=[row[1]]),
+    ),
+    Section(
+        "groups",
+        Group.objects.values_list("pk", "slug"),
+        lambda row: reverse("group", args=[row[1]]),
+    ),
+)
+
+
+def sitemap_root():
+    return os.path.join(settings.MEDIA_ROOT, settings.SITEMAP_DIR)
+
+
+def write_atomic(directory, name, chunks):
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, os.path.join(directory, name))
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def urlset(base_url, urls):
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield f'<urlset xmlns="{SITEMAP_NS}">\n'
+    for location, lastmod in urls:
+        yield f"<url><loc>{escape(base_url + location)}</loc>"
+        if lastmod is not None:
+            yield f"<lastmod>{lastmod.date().isoformat()}</lastmod>"
+        yield "</url>\n"
+    yield "</urlset>\n"
+
+
+def sitemap_index(base_url, shards):
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield f'<sitemapindex xmlns="{SITEMAP_NS}">\n'
+    for name, lastmod in shards:
+        yield (
+            f"<sitemap><loc>{escape(base_url)}/{name}</loc>"
+            f"<lastmod>{lastmod}</lastmod></sitemap>\n"
+        )
+    yield "</sitemapindex>\n"
+
+
+def build_sitemaps(force=False, shard_size=None):
+    """Пересобирает файлы карты сайта, у которых изменился отпечаток,
+    и индекс. Возвращает имена переписанных файлов
+    """
+    shard_size = shard_size or settings.SITEMAP_SHARD_SIZE
+    root = sitemap_root()
+    os.makedirs(root, exist_ok=True)
+    manifest_path = os.path.join(root, MANIFEST_NAME)
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    if manifest.get("shard_size") != shard_size:
+        manifest = {"shard_size": shard_size, "shards": {}}
+
+    base_url = "{}://{}".format(
+        settings.SITEMAP_PROTOCOL, Site.objects.get_current().domain
+    )
+    previous = manifest["shards"]
+    shards = {}
+    written = []
+    for section in SECTIONS:
+        for name, pk_range in section.shards(shard_size):
+            fingerprint = section.shard_fingerprint(pk_range)
+            entry = previous.get(name)
+            if (
+                force
+                or entry is None
+                or entry["fingerprint"] != fingerprint
+                or not os.path.exists(os.path.join(root, name))
+            ):
+                write_atomic(
+                    root, name, urlset(base_url, section.urls(pk_range))
+                )
+                entry = {
+                    "fingerprint": fingerprint,
+                    "lastmod": timezone.now().isoformat(),
+                }
+                written.append(name)
+            shards[name] = entry
+
+    for name in set(previous) - set(shards):
+        if os.path.exists(os.path.join(root, name)):
+            os.remove(os.path.join(root, name))
+    if (
+        written
+        or set(previous) != set(shards)
+        or not os.path.exists(os.path.join(root, INDEX_NAME))
+    ):
+        write_atomic(root, INDEX_NAME, sitemap_index(
+            base_url,
+            ((name, entry["lastmod"]) for name, entry in shards.items()),
+        ))
+        written.append(INDEX_NAME)
+    manifest["shards"] = shards
+    write_atomic(root, MANIFEST_NAME, [json.dumps(manifest)])
+    return written
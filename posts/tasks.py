@@ -0,0 +1,169 @@
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from sorl.thumbnail import get_thumbnail
+
+from core.models import Blob
+from core.tasks import task
+
+from . import counters, prerender, reactions
+from .feeds import invalidate_feeds
+from .pagination import forget_counts
+from .models import (
+    Comment, Follow, Like, MonthlyPostCount, Post, PostTag,
+    month_start,
+)
+
+
+User = get_user_model()
+
+POST_THUMBNAIL = ("960x339", {"crop": "center", "upscale": True})
+
+
+@task
+def warm_thumbnail(post_id):
+    """Готовит миниатюру заранее, чтобы её не строил первый просмотр"""
+    post = Post.objects.filter(pk=post_id).first()
+    if post is not None and post.image:
+        geometry, options = POST_THUMBNAIL
+        get_thumbnail(post.image, geometry, **options)
+
+
+@task(name="posts.flush_likes")
+def flush_likes():
+    """Переносит накопленные события LikeEvent в Like и Post.likes"""
+    reactions.flush()
+
+
+@task(name="posts.flush_views")
+def flush_views(counts):
+    """Прибавляет к записям просмотры, накопленные процессом"""
+    counters.apply_views(counts)
+
+
+@task(name="posts.prerender_page")
+def prerender_page(path):
+    """Перерисовывает готовую страницу для анонимных посетителей"""
+    prerender.render_page(path)
+
+
+@task(name="posts.prerender_user")
+def prerender_user(username):
+    prerender.render_user_pages(username)
+
+
+def delete_batch(queryset, batch_size):
+    """Удаляет до batch_size строк одним DELETE по диапазону ключей,
+    без загрузки объектов и сигналов
+    """
+    pks = list(
+        queryset.order_by("pk").values_list("pk", flat=True)[:batch_size]
+    )
+    if not pks:
+        return 0
+    return queryset.filter(pk__gte=pks[0], pk__lte=pks[-1])._raw_delete(
+        queryset.db
+    )
+
+
+def delete_likes_batch(user_id, batch_size):
+    """Удаляет пачку лайков пользователя и пересчитывает Post.likes
+    у записей, которые он лайкал
+    """
+    likes = Like.objects.filter(user_id=user_id)
+    rows = list(
+        likes.order_by("pk").values_list("pk", "post_id")[:batch_size]
+    )
+    if not rows:
+        return 0
+    with transaction.atomic():
+        likes.filter(pk__gte=rows[0][0], pk__lte=rows[-1][0])._raw_delete(
+            likes.db
+        )
+        reactions.recount({post_id for _, post_id in rows})
+    return len(rows)
+
+
+def delete_comments_batch(user_id, batch_size):
+    """Удаляет пачку комментариев пользователя; готовые страницы с
+    записями, под которыми они были, перерисовываются
+    """
+    comments = Comment.objects.filter(author_id=user_id)
+    rows = list(comments.order_by("pk").values_list(
+        "pk", "post_id", "post__author__username", "post__group__slug"
+    )[:batch_size])
+    if not rows:
+        return 0
+    comments.filter(pk__gte=rows[0][0], pk__lte=rows[-1][0])._raw_delete(
+        comments.db
+    )
+    prerender.schedule(*prerender.posts_pages(
+        (post_id, username, slug) for _, post_id, username, slug in rows
+    ))
+    return len(rows)
+
+
+def delete_posts_batch(user_id, batch_size):
+    """Удаляет пачку записей автора с их комментариями и тегами,
+    поправляя то, что обычно делают сигналы Post: счётчики архива,
+    ссылки на картинки, версии лент и готовые страницы
+    """
+    posts = Post.objects.filter(author_id=user_id).order_by("pk")
+    rows = list(posts.values_list(
+        "pk", "pub_date", "group_id", "image", "author__username",
+        "group__slug",
+    )[:batch_size])
+    if not rows:
+        return 0
+    pks = [row[0] for row in rows]
+    months = Counter()
+    with transaction.atomic():
+        Comment.objects.filter(post_id__in=pks)._raw_delete(Comment.objects.db)
+        PostTag.objects.filter(post_id__in=pks)._raw_delete(PostTag.objects.db)
+        Like.objects.filter(post_id__in=pks)._raw_delete(Like.objects.db)
+        posts.filter(pk__gte=pks[0], pk__lte=pks[-1])._raw_delete(posts.db)
+        for _, pub_date, group_id, image, _, _ in rows:
+            month = month_start(pub_date)
+            months[MonthlyPostCount.SITE, 0, month] += 1
+            months[MonthlyPostCount.AUTHOR, user_id, month] += 1
+            if group_id:
+                months[MonthlyPostCount.GROUP, group_id, month] += 1
+            if image:
+                Blob.objects.release(image)
+        for (scope, object_id, month), count in months.items():
+            MonthlyPostCount.objects.add(scope, object_id, month, -count)
+    slugs = {slug for *_, slug in rows if slug}
+    invalidate_feeds("site", *(f"group:{slug}" for slug in slugs))
+    forget_counts("index", f"profile:{user_id}", *(
+        f"group:{group_id}" for _, _, group_id, *_ in rows if group_id
+    ))
+    prerender.schedule(*prerender.posts_pages(
+        (pk, username, slug) for pk, _, _, _, username, slug in rows
+    ))
+    return len(rows)
+
+
+@task(name="posts.delete_user")
+def delete_user(user_id):
+    """Удаляет пользователя по частям: комментарии, подписки, лайки и
+    записи уходят пачками по USER_DELETE_BATCH_SIZE в отдельных
+    транзакциях, поэтому база не блокируется надолго. Саму строку
+    пользователя удаляет обычный delete(), когда зависимых строк уже
+    не осталось
+    """
+    batch_size = settings.USER_DELETE_BATCH_SIZE
+    while delete_comments_batch(user_id, batch_size):
+        pass
+    for queryset in (
+        Follow.objects.filter(user_id=user_id),
+        Follow.objects.filter(author_id=user_id),
+    ):
+        while delete_batch(queryset, batch_size):
+            pass
+    while delete_likes_batch(user_id, batch_size):
+        pass
+    while delete_posts_batch(user_id, batch_size):
+        pass
+    User.objects.filter(pk=user_id, is_active=False).delete()
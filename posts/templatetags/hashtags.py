@@ -0,0 +1,22 @@
+from django import template
+from django.urls import reverse
+from django.utils.html import conditional_escape
+from django.utils.safestring import mark_safe
+
+from posts.models import TAG_RE
+
+
+register = template.Library()
+
+
+@register.filter(needs_autoescape=True)
+def hashtags(text, autoescape=True):
+    """Превращает #теги в тексте записи в ссылки на ленты тегов"""
+    if autoescape:
+        text = conditional_escape(text)
+
+    def link(match):
+        name = match.group(1)
+        url = reverse("tag", args=[name.lower()])
+        return f'<a href="{url}">#{name}</a>'
+    return mark_safe(TAG_RE.sub(link, text))
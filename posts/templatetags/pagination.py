@@ -0,0 +1,26 @@
+from django import template
+
+
+register = template.Library()
+
+
+@register.filter
+def elided_page_range(page, on_each_side=2):
+    """Номера страниц вокруг текущей и по краям; None — место для «…»"""
+    num_pages = page.paginator.num_pages
+    number = page.number
+    window = range(
+        max(number - on_each_side, 1),
+        min(number + on_each_side, num_pages) + 1,
+    )
+    pages = []
+    if window[0] > 1:
+        pages.append(1)
+        if window[0] > 2:
+            pages.append(None)
+    pages.extend(window)
+    if window[-1] < num_pages:
+        if window[-1] < num_pages - 1:
+            pages.append(None)
+        pages.append(num_pages)
+    return pages
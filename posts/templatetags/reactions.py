@@ -0,0 +1,24 @@
+from django import template
+
+from posts.counters import view_count
+from posts.reactions import like_counts
+
+
+register = template.Library()
+
+
+@register.filter
+def likes(post):
+    """Число лайков с учётом ещё не сброшенных в базу. View страницы
+    считает их сразу для всех записей (attach_like_counts)
+    """
+    count = getattr(post, "like_count", None)
+    if count is None:
+        count = like_counts([post])[post.pk]
+    return count
+
+
+@register.filter
+def views(post):
+    """Число просмотров с учётом ещё не сброшенных этим процессом"""
+    return view_count(post)
@@ -1,11 +1,42 @@
-from django.test import TestCase, Client, override_settings
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.utils import timezone
+
+from django.test import TestCase, TransactionTestCase, Client
+from django.test import override_settings
+from django.core.management import call_command
+from django.core.paginator import Paginator
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.core.cache import cache
 from django.contrib.auth import get_user_model
 from django.urls import reverse
-from django.http import HttpResponse
+from django.template import engines
+from django.http import Http404, HttpResponse
 from django.core.files.uploadedfile import SimpleUploadedFile
 
-from .models import User, Post, Group, Comment
+from core.cache import shared_cache
+from core.identity import IdentityCache
+from core.models import Blob, BlobQuerySet, Task
+from core.tasks import claim, execute
+
+from . import counters
+from .identity import groups, users
+from .prerender import page_name, render_all
+from .reactions import flush, like_counts, toggle_like
+from .sitemaps import SECTIONS, build_sitemaps
+
+from .models import (
+    User, Post, Group, Comment, Follow, Like, LikeEvent, MonthlyPostCount,
+    PostTag, Tag,
+)
+from .templatetags.pagination import elided_page_range
 
 
 User = get_user_model()
@@ -329,6 +360,49 @@ class FollowCaseTest(TestCase):
         response = self.authorized_client.get(url)
         self.assertContains(response, self.post)
 
+    def test_follow_single_query(self):
+        """Подписка и отписка выполняют по одному запросу на запись"""
+        self.authorized_client.get(reverse("follow_index"))
+        url = reverse("profile_follow", args=[self.user_one])
+        with self.assertNumQueries(2):
+            # поиск автора и INSERT, сессия и пользователь уже в кэше
+            self.authorized_client.get(url)
+        self.authorized_client.get(url)
+        self.assertEqual(self.user_two.follower.count(), 1)
+        url = reverse("profile_unfollow", args=[self.user_one])
+        with self.assertNumQueries(1):
+            self.authorized_client.get(url)
+        self.assertEqual(self.user_two.follower.count(), 0)
+
+    def test_follow_bulk(self):
+        """Массовая подписка и отписка на нескольких авторов"""
+        user_three = User.objects.create_user(username="TestUser3")
+        self.authorized_client.post(
+            reverse("follow_bulk"),
+            {"authors": [self.user_one, user_three, self.user_two]}
+        )
+        self.assertEqual(self.user_two.follower.count(), 2)
+        self.authorized_client.post(
+            reverse("follow_bulk"),
+            {"authors": [self.user_one], "action": "unfollow"}
+        )
+        self.assertEqual(
+            list(self.user_two.follower.values_list("author", flat=True)),
+            [user_three.id]
+        )
+
+    def test_follow_authors_command(self):
+        call_command(
+            "follow_authors", self.user_two.username, self.user_one.username,
+            stdout=StringIO()
+        )
+        self.assertEqual(self.user_two.follower.count(), 1)
+        call_command(
+            "follow_authors", self.user_two.username, self.user_one.username,
+            "--unfollow", stdout=StringIO()
+        )
+        self.assertEqual(self.user_two.follower.count(), 0)
+
 
 class CommentCaseTest(TestCase):
     def setUp(self):
@@ -380,4 +454,931 @@ class CommentCaseTest(TestCase):
             author=self.user,
             post=self.post,
         ).count(), 1)
-    
\ No newline at end of file
+    
+
+class ArchiveTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="TestUser")
+        self.group = Group.objects.create(
+            title="Тестовая группа",
+            slug="testgroup",
+            description="Тестовое описание"
+        )
+        self.post = Post.objects.create(
+            text="Пост в группе",
+            group=self.group,
+            author=self.user,
+        )
+        self.month = timezone.localtime(self.post.pub_date).date()
+        self.args = [self.month.year, self.month.month]
+
+    def get_count(self, scope, object_id=0):
+        return MonthlyPostCount.objects.get(
+            scope=scope, object_id=object_id, month=self.month.replace(day=1)
+        ).count
+
+    def test_counts_follow_posts(self):
+        """Счётчики месяца меняются при создании, переносе и удалении"""
+        Post.objects.create(text="Без группы", author=self.user)
+        self.assertEqual(self.get_count(MonthlyPostCount.SITE), 2)
+        self.assertEqual(
+            self.get_count(MonthlyPostCount.AUTHOR, self.user.id), 2
+        )
+        self.assertEqual(
+            self.get_count(MonthlyPostCount.GROUP, self.group.id), 1
+        )
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = None
+        post.save()
+        self.assertEqual(
+            self.get_count(MonthlyPostCount.GROUP, self.group.id), 0
+        )
+        post.delete()
+        self.assertEqual(self.get_count(MonthlyPostCount.SITE), 1)
+
+    def test_archive_pages(self):
+        urls = (
+            reverse("archive", args=self.args),
+            reverse("group_archive", args=[self.group.slug] + self.args),
+            reverse("profile_archive", args=[self.user.username] + self.args),
+        )
+        for url in urls:
+            response = self.client.get(url)
+            self.assertContains(response, self.post.text)
+            self.assertEqual(response.context["months"][0].count, 1)
+        response = self.client.get(reverse("archive", args=[2000, 1]))
+        self.assertNotContains(response, self.post.text)
+        response = self.client.get(reverse("archive", args=[2000, 13]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_archive_constant_queries(self):
+        """Число запросов не зависит от количества постов за месяц"""
+        url = reverse("group_archive", args=[self.group.slug] + self.args)
+        with self.assertNumQueries(4):
+            self.client.get(url)
+        for i in range(5):
+            post = Post.objects.create(
+                text=f"Пост {i}", group=self.group, author=self.user
+            )
+            Comment.objects.create(post=post, author=self.user, text="!")
+        # Группа уже в кэше identity, остаются счётчики месяцев, записи
+        # и несброшенные лайки всей страницы
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertContains(response, "Комментариев: 1", count=5)
+
+
+class PaginationTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="TestUser")
+        self.group = Group.objects.create(
+            title="Тестовая группа",
+            slug="testgroup",
+            description="Тестовое описание"
+        )
+        self.create_posts(25)
+        self.url = reverse("group", args=[self.group.slug])
+
+    def create_posts(self, count):
+        Post.objects.bulk_create(
+            Post(text=f"Пост {i}", group=self.group, author=self.user)
+            for i in range(count)
+        )
+
+    def test_elided_page_range(self):
+        page = Paginator(range(1000), 10).page(50)
+        self.assertEqual(
+            elided_page_range(page),
+            [1, None, 48, 49, 50, 51, 52, None, 100]
+        )
+        page = Paginator(range(30), 10).page(1)
+        self.assertEqual(elided_page_range(page), [1, 2, 3])
+
+    def test_estimated_count(self):
+        """Для внутренних страниц берётся закэшированное число постов,
+        последняя и несуществующие страницы пересчитывают его точно
+        """
+        self.client.get(self.url)
+        self.create_posts(10)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertFalse(any("COUNT" in q["sql"] for q in queries))
+        self.assertEqual(response.context["paginator"].count, 25)
+        self.assertEqual(len(response.context["page"]), 10)
+        response = self.client.get(self.url, {"page": 4})
+        self.assertEqual(response.context["paginator"].count, 35)
+        self.assertEqual(response.context["page"].number, 4)
+        self.assertEqual(len(response.context["page"]), 5)
+
+    def test_empty_inner_page(self):
+        """Если внутренняя по оценке страница пуста, число постов
+        пересчитывается точно
+        """
+        self.client.get(self.url)
+        # update() не отправляет сигналов, оценка остаётся прежней
+        Post.objects.filter(
+            pk__in=Post.objects.order_by("pk").values("pk")[:20]
+        ).update(group=None)
+        response = self.client.get(self.url, {"page": 2})
+        self.assertEqual(response.context["paginator"].count, 5)
+        self.assertEqual(response.context["page"].number, 1)
+        self.assertEqual(len(response.context["page"]), 5)
+
+    def test_new_post_resets_estimate(self):
+        self.client.get(self.url)
+        Post.objects.create(text="Новый", group=self.group, author=self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.context["paginator"].count, 26)
+
+
+GIF = (
+    b"\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x80\x00\x00\x05\x04"
+    b"\x04\x00\x00\x00\x2c\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02"
+    b"\x44\x01\x00\x3b"
+)
+
+
+class BlobStorageTestCase(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.media_root = media_root
+        self.user = User.objects.create_user(username="TestUser")
+
+    def create_post(self, content=GIF, filename="pic.gif"):
+        return Post.objects.create(
+            text="Пост с картинкой",
+            author=self.user,
+            image=SimpleUploadedFile(filename, content),
+        )
+
+    def path(self, name):
+        return os.path.join(self.media_root, name)
+
+    def test_duplicates_share_file(self):
+        """Одинаковые картинки хранятся одним файлом под хэшем
+        содержимого
+        """
+        first = self.create_post(filename="one.gif")
+        second = self.create_post(filename="two.GIF")
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(
+            first.image.name,
+            r"^posts/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.gif$",
+        )
+        self.assertTrue(os.path.exists(self.path(first.image.name)))
+        self.assertEqual(Blob.objects.get().refcount, 2)
+        self.assertEqual(os.listdir(self.path("tmp")), [])
+
+    def test_garbage_collection(self):
+        """Файл удаляется только когда на него не осталось ссылок"""
+        first = self.create_post()
+        second = self.create_post()
+        name = first.image.name
+        first.delete()
+        call_command("collect_blobs", grace=0, stdout=StringIO())
+        self.assertTrue(os.path.exists(self.path(name)))
+        Post.objects.get(pk=second.pk).delete()
+        blob = Blob.objects.get(name=name)
+        self.assertEqual(blob.refcount, 0)
+        self.assertIsNotNone(blob.released_at)
+        call_command("collect_blobs", stdout=StringIO())
+        self.assertTrue(os.path.exists(self.path(name)))
+        call_command("collect_blobs", grace=0, stdout=StringIO())
+        self.assertFalse(os.path.exists(self.path(name)))
+        self.assertFalse(Blob.objects.exists())
+
+    def test_collect_during_upload(self):
+        """Если сборщик удалил файл, пока загружалось то же содержимое,
+        загрузка записывает файл заново
+        """
+        post = self.create_post()
+        name = post.image.name
+        post.delete()
+        Blob.objects.filter(name=name).update(
+            released_at=timezone.now() - timedelta(days=2)
+        )
+        register = BlobQuerySet.register
+
+        def collect_then_register(queryset, name):
+            call_command("collect_blobs", stdout=StringIO())
+            return register(queryset, name)
+
+        with mock.patch.object(BlobQuerySet, "register", collect_then_register):
+            post = self.create_post()
+        self.assertEqual(post.image.name, name)
+        self.assertTrue(os.path.exists(self.path(name)))
+        self.assertEqual(Blob.objects.get(name=name).refcount, 1)
+
+    def test_edit_releases_old_image(self):
+        """Замена картинки освобождает ссылку на прежний файл"""
+        post = self.create_post()
+        old_name = post.image.name
+        post.image = SimpleUploadedFile("new.gif", GIF + b"\x00")
+        post.save()
+        self.assertNotEqual(post.image.name, old_name)
+        self.assertEqual(Blob.objects.get(name=old_name).refcount, 0)
+        self.assertEqual(Blob.objects.get(name=post.image.name).refcount, 1)
+        post.text = "Новый текст"
+        post.save()
+        self.assertEqual(Blob.objects.get(name=post.image.name).refcount, 1)
+
+
+class FeedTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="TestUser")
+        self.group = Group.objects.create(
+            title="Тестовая группа",
+            slug="testgroup",
+            description="Тестовое описание",
+        )
+        Post.objects.create(
+            text="Запись в группе", author=self.user, group=self.group
+        )
+        other = User.objects.create_user(username="OtherUser")
+        Post.objects.create(text="Запись без группы", author=other)
+
+    def test_feeds(self):
+        """Ленты сайта, группы и автора содержат только свои записи"""
+        response = self.client.get(reverse("feed_rss"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith(
+            "application/rss+xml"
+        ))
+        self.assertContains(response, "Запись в группе")
+        self.assertContains(response, "Запись без группы")
+        for name, args in (
+            ("group_rss", [self.group.slug]),
+            ("group_atom", [self.group.slug]),
+            ("profile_rss", [self.user.username]),
+        ):
+            response = self.client.get(reverse(name, args=args))
+            self.assertContains(response, "Запись в группе")
+            self.assertNotContains(response, "Запись без группы")
+        response = self.client.get(reverse("feed_atom"))
+        self.assertTrue(response["Content-Type"].startswith(
+            "application/atom+xml"
+        ))
+        response = self.client.get(reverse("group_rss", args=["missing"]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_conditional_polling(self):
+        """Повторный опрос без изменений не обращается к базе"""
+        url = reverse("group_rss", args=[self.group.slug])
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertTrue(response.has_header("Last-Modified"))
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            response = self.client.get(url)
+            self.assertEqual(response["ETag"], etag)
+        Post.objects.create(
+            text="Новая запись", author=self.user, group=self.group
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Новая запись")
+        self.assertNotEqual(response["ETag"], etag)
+
+
+class SitemapTestCase(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user(username="TestUser")
+        self.group = Group.objects.create(
+            title="Тестовая группа",
+            slug="testgroup",
+            description="Тестовое описание",
+        )
+        self.posts = [
+            Post.objects.create(text=f"Запись {i}", author=self.user)
+            for i in range(3)
+        ]
+        # Шарды по два ключа: записи попадают в разные файлы
+        self.shard_size = 2
+        last_shard = (self.posts[-1].pk - 1) // self.shard_size
+        self.last_shard = f"sitemap-posts-{last_shard}.xml"
+
+    def build(self):
+        return build_sitemaps(shard_size=self.shard_size)
+
+    def test_build_and_serve(self):
+        written = self.build()
+        self.assertIn("sitemap.xml", written)
+        self.assertIn(self.last_shard, written)
+        response = self.client.get("/sitemap.xml")
+        self.assertEqual(response.status_code, 200)
+        index = b"".join(response.streaming_content).decode()
+        self.assertIn(f"/{self.last_shard}</loc>", index)
+        self.assertIn("sitemap-groups-0.xml", index)
+
+        response = self.client.get("/" + self.last_shard)
+        urls = b"".join(response.streaming_content).decode()
+        post = self.posts[-1]
+        self.assertIn(reverse("post", args=[self.user.username, post.pk]), urls)
+        self.assertEqual(self.client.get("/sitemap-none.xml").status_code, 404)
+
+    def test_only_changed_shards(self):
+        """Повторная сборка переписывает только изменившиеся файлы"""
+        self.build()
+        self.assertEqual(self.build(), [])
+        first_shard = (self.posts[0].pk - 1) // self.shard_size
+        self.posts[0].delete()
+        self.assertEqual(
+            sorted(self.build()),
+            sorted([f"sitemap-posts-{first_shard}.xml", "sitemap.xml"]),
+        )
+        out = StringIO()
+        call_command(
+            "build_sitemaps", shard_size=self.shard_size, force=True,
+            stdout=out,
+        )
+        self.assertNotIn("Обновлено файлов: 0", out.getvalue())
+
+    def test_shard_count(self):
+        """Шардов ровно столько, сколько нужно до наибольшего ключа"""
+        section = next(s for s in SECTIONS if s.name == "posts")
+        last_pk = self.posts[-1].pk
+        self.assertEqual(
+            [name for name, _ in section.shards(last_pk)],
+            ["sitemap-posts-0.xml"],
+        )
+        Post.objects.all().delete()
+        self.assertEqual(list(section.shards(self.shard_size)), [])
+
+
+class AdminTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser(
+            username="admin", email="admin@email.com", password="1fx6|unz#i"
+        )
+        self.client.force_login(self.admin)
+        self.group = Group.objects.create(
+            title="Тестовая группа",
+            slug="testgroup",
+            description="Тестовое описание",
+        )
+
+    def add_rows(self, count):
+        start = User.objects.count()
+        for i in range(start, start + count):
+            author = User.objects.create_user(username=f"user{i}")
+            post = Post.objects.create(
+                text=f"Запись {i}", author=author, group=self.group
+            )
+            Comment.objects.create(post=post, author=author, text="Ок")
+            Follow.objects.create(user=self.admin, author=author)
+
+    def count_queries(self, url):
+        cache.clear()
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_queries_do_not_grow_with_rows(self):
+        """Число запросов списка не зависит от числа строк"""
+        urls = [
+            reverse(f"admin:posts_{model}_changelist")
+            for model in ("post", "comment", "follow")
+        ]
+        self.add_rows(2)
+        before = [self.count_queries(url) for url in urls]
+        self.add_rows(5)
+        after = [self.count_queries(url) for url in urls]
+        self.assertEqual(before, after)
+
+    def test_input_filter(self):
+        self.add_rows(3)
+        url = reverse("admin:posts_post_changelist")
+        response = self.client.get(url, {"author": "user2"})
+        self.assertContains(response, "Запись 2")
+        self.assertNotContains(response, "Запись 1<")
+        self.assertContains(response, 'name="author" value="user2"')
+        response = self.client.get(
+            reverse("admin:posts_follow_changelist"), {"user": "admin"}
+        )
+        self.assertEqual(response.context["cl"].result_count, 3)
+        response = self.client.get(
+            reverse("admin:posts_comment_changelist"), {"post": "abc"}
+        )
+        self.assertRedirects(
+            response, reverse("admin:posts_comment_changelist") + "?e=1"
+        )
+
+
+class TagTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="TestUser")
+        self.client.force_login(self.user)
+
+    def tags(self, post):
+        return set(post.tag_links.values_list("tag__name", flat=True))
+
+    def test_tags_on_save(self):
+        """Теги извлекаются при создании и правке записи"""
+        self.client.post(
+            reverse("new_post"), {"text": "Про #Django и #python, #django"}
+        )
+        post = Post.objects.get()
+        self.assertEqual(self.tags(post), {"django", "python"})
+        self.client.post(
+            reverse("post_edit", args=[self.user.username, post.id]),
+            {"text": "Только #django&co, а не a#b и не &#39;"},
+        )
+        self.assertEqual(self.tags(post), {"django"})
+        self.assertEqual(Tag.objects.count(), 2)
+
+        response = self.client.get(reverse("tag", args=["Django"]))
+        self.assertContains(response, "Только")
+        self.assertContains(
+            response, f'<a href="{reverse("tag", args=["django"])}">#django</a>'
+        )
+        response = self.client.get(reverse("tag", args=["python"]))
+        self.assertNotContains(response, "Только")
+        self.assertEqual(
+            self.client.get(reverse("tag", args=["missing"])).status_code, 404
+        )
+
+    def test_cursor_pagination(self):
+        for i in range(12):
+            Post.objects.create(text=f"Запись {i} #тег", author=self.user)
+        url = reverse("tag", args=["тег"])
+        response = self.client.get(url)
+        self.assertEqual(
+            [post.text for post in response.context["posts"]],
+            [f"Запись {i} #тег" for i in range(11, 1, -1)],
+        )
+        cursor = response.context["next_cursor"]
+        # Тег, курсор, записи и лайки страницы одним запросом
+        with self.assertNumQueries(4):
+            response = self.client.get(url, {"cursor": cursor})
+        self.assertEqual(
+            [post.text for post in response.context["posts"]],
+            ["Запись 1 #тег", "Запись 0 #тег"],
+        )
+        self.assertIsNone(response.context["next_cursor"])
+
+    def test_bad_cursor(self):
+        """Испорченный или огромный курсор открывает первую страницу"""
+        Post.objects.create(text="Запись #тег", author=self.user)
+        url = reverse("tag", args=["тег"])
+        for cursor in (
+            "99999999999999999999999.1",
+            "1.99999999999999999999999",
+            "abc",
+            "².1",
+        ):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(url, {"cursor": cursor})
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.context["is_first_page"])
+                self.assertEqual(len(response.context["posts"]), 1)
+
+    def test_backfill(self):
+        Post.objects.create(text="#один #два", author=self.user)
+        Post.objects.create(text="#два", author=self.user)
+        PostTag.objects.all().delete()
+        call_command("backfill_tags", batch_size=1, stdout=StringIO())
+        self.assertEqual(
+            sorted(PostTag.objects.values_list("tag__name", flat=True)),
+            ["два", "два", "один"],
+        )
+
+
+class ReactionTestCase(TestCase):
+    def setUp(self):
+        shared_cache.clear()
+        self.user = User.objects.create_user(username="TestUser")
+        self.other = User.objects.create_user(username="OtherUser")
+        self.post = Post.objects.create(text="Запись", author=self.other)
+        self.url = reverse("like", args=[self.other.username, self.post.id])
+
+    def count(self):
+        return like_counts([Post.objects.get(pk=self.post.pk)])[self.post.pk]
+
+    def test_buffered_likes(self):
+        """Лайк сразу виден в счётчике, но в базу попадает при сбросе"""
+        self.client.force_login(self.user)
+        self.client.post(self.url)
+        self.assertTrue(
+            Task.objects.filter(name="posts.flush_likes").exists()
+        )
+        with self.assertNumQueries(3):
+            # Проверка записи и два INSERT события: ни UPDATE, ни новой
+            # задачи сброса
+            self.client.post(self.url)
+            toggle_like(self.post.id, self.user.id)
+        self.assertEqual(self.count(), 1)
+        self.assertFalse(Like.objects.exists())
+        response = self.client.get(
+            reverse("post", args=[self.other.username, self.post.id])
+        )
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(flush(), 3)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).likes, 1)
+        self.assertEqual(self.count(), 1)
+        self.assertEqual(Like.objects.get().user, self.user)
+        self.assertFalse(LikeEvent.objects.exists())
+
+    def test_no_double_like(self):
+        """Один пользователь не может лайкнуть запись дважды"""
+        self.assertTrue(toggle_like(self.post.id, self.user.id))
+        shared_cache.clear()
+        # Состояние восстанавливается из несброшенных событий
+        self.assertFalse(toggle_like(self.post.id, self.user.id))
+        self.assertTrue(toggle_like(self.post.id, self.user.id))
+        flush()
+        shared_cache.clear()
+        # и из базы: повторный клик снимает лайк
+        self.assertFalse(toggle_like(self.post.id, self.user.id))
+        self.assertTrue(toggle_like(self.post.id, self.other.id))
+        self.assertEqual(self.count(), 1)
+        flush()
+        self.assertEqual(Post.objects.get(pk=self.post.pk).likes, 1)
+        self.assertEqual(Like.objects.get().user, self.other)
+
+    def test_anonymous(self):
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(LikeEvent.objects.exists())
+
+    def test_form_only_for_users(self):
+        """Гостю не отдаётся форма с CSRF-токеном: иначе cookie csrftoken
+        и Vary: Cookie сломали бы общий кэш страниц
+        """
+        url = reverse("profile", args=[self.other.username])
+        response = self.client.get(url)
+        self.assertNotIn("csrftoken", response.cookies)
+        self.assertNotContains(response, "csrfmiddlewaretoken")
+        self.assertContains(response, "♥ 0")
+        self.client.force_login(self.user)
+        response = self.client.get(url)
+        self.assertContains(response, self.url)
+
+    def test_cache_eviction(self):
+        """Вытеснение из кэша не теряет лайки, ждущие сброса"""
+        toggle_like(self.post.id, self.user.id)
+        toggle_like(self.post.id, self.other.id)
+        shared_cache.clear()
+        self.assertEqual(self.count(), 2)
+        self.assertEqual(flush(), 2)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).likes, 2)
+        self.assertEqual(self.count(), 2)
+
+
+class ViewCounterTestCase(TestCase):
+    def setUp(self):
+        counters.buffer.drain()
+        counters.buffer.seen.reset()
+        self.author = User.objects.create_user(username="Author")
+        self.post = Post.objects.create(text="Запись", author=self.author)
+        self.url = reverse("post", args=[self.author.username, self.post.id])
+
+    def visit(self, username):
+        client = Client()
+        client.force_login(
+            User.objects.get_or_create(username=username)[0]
+        )
+        return client.get(self.url)
+
+    def test_views_are_buffered(self):
+        """Просмотр не пишет в базу, повтор того же посетителя не считается"""
+        self.visit("first")
+        with self.assertNumQueries(0):
+            counters.buffer.add(self.post.id, "u-test")
+        response = self.visit("first")
+        self.assertContains(response, "Просмотров: 2")
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 0)
+        self.assertFalse(Task.objects.filter(name="posts.flush_views"))
+
+    def test_flush(self):
+        other = Post.objects.create(text="Другая", author=self.author)
+        counters.buffer.add(other.id, "u-test")
+        with self.settings(VIEWS_FLUSH_INTERVAL=0):
+            self.visit("first")
+        # Буфер уходит в очередь одной задачей на все записи
+        task = Task.objects.get(name="posts.flush_views")
+        self.assertEqual(counters.buffer.drain(), {})
+        self.assertTrue(execute(task.pk))
+        self.assertEqual(
+            dict(Post.objects.values_list("pk", "views")),
+            {self.post.id: 1, other.id: 1},
+        )
+
+    def test_seen_filter(self):
+        seen = counters.SeenFilter(1024, 3, 60)
+        self.assertTrue(seen.add("u1:1"))
+        self.assertFalse(seen.add("u1:1"))
+        self.assertTrue(seen.add("u1:2"))
+        seen.started -= 61
+        self.assertTrue(seen.add("u1:1"))
+
+    def test_sort_by_views(self):
+        popular = Post.objects.create(text="Популярная", author=self.author)
+        counters.apply_views([[popular.id, 5], [self.post.id, 2]])
+        response = self.client.get(
+            reverse("profile", args=[self.author.username]), {"sort": "views"}
+        )
+        self.assertEqual(
+            [post.id for post in response.context["page"]],
+            [popular.id, self.post.id],
+        )
+
+
+class ViewFlushTimerTestCase(TransactionTestCase):
+    @override_settings(VIEWS_FLUSH_INTERVAL=0.1)
+    def test_idle_buffer_is_flushed(self):
+        """Просмотры уходят в очередь, даже если новых запросов нет"""
+        counters.buffer.drain()
+        counters.buffer.seen.reset()
+        counters.buffer.add(42, "u-test")
+        timer = counters.buffer.timer
+        timer.join(5)
+        self.assertEqual(counters.buffer.pending(42), 0)
+        self.assertTrue(Task.objects.filter(name="posts.flush_views"))
+
+
+class IdentityCacheTestCase(TestCase):
+    def setUp(self):
+        users.invalidate()
+        groups.invalidate()
+        self.user = User.objects.create_user(
+            username="TestUser", first_name="Лев", last_name="Толстой"
+        )
+        self.group = Group.objects.create(
+            title="Группа", slug="group", description="Описание"
+        )
+
+    def test_lookup_is_cached(self):
+        with self.assertNumQueries(2):
+            users.get_or_404("TestUser")
+            groups.get_or_404("group")
+        with self.assertNumQueries(0):
+            profile = users.get_or_404("TestUser", is_active=True)
+            group = groups.get_or_404("group")
+        self.assertEqual(profile, self.user)
+        self.assertEqual(profile.get_full_name(), "Лев Толстой")
+        self.assertEqual(group.title, "Группа")
+        # Объект каждый раз новый: правка не портит кэш
+        profile.first_name = "Пётр"
+        self.assertEqual(users.get("TestUser").first_name, "Лев")
+
+    def test_invalidation(self):
+        users.get_or_404("TestUser")
+        groups.get_or_404("group")
+        self.user.username = "Renamed"
+        self.user.save()
+        with self.assertRaises(Http404):
+            users.get_or_404("TestUser")
+        self.group.delete()
+        with self.assertRaises(Http404):
+            groups.get_or_404("group")
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(Http404):
+            users.get_or_404("Renamed", is_active=True)
+        response = self.client.get(reverse("profile", args=["Renamed"]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_login_keeps_cache(self):
+        users.get_or_404("TestUser")
+        self.user.last_login = timezone.now()
+        self.user.save(update_fields=["last_login"])
+        with self.assertNumQueries(0):
+            users.get_or_404("TestUser")
+
+    def test_unchanged_save_keeps_cache(self):
+        """Регистрация и сохранение без правки полей кэш не сбрасывают"""
+        users.get_or_404("TestUser")
+        User.objects.create_user(username="NewUser")
+        self.user.email = "user@example.com"
+        self.user.save()
+        with self.assertNumQueries(0):
+            users.get_or_404("TestUser")
+
+    @override_settings(IDENTITY_CACHE_CHECK_INTERVAL=0)
+    def test_other_process_invalidation(self):
+        """Кэш другого процесса сбрасывается по поколению в общем кэше"""
+        other = IdentityCache(User, "username", users.fields)
+        other.get_or_404("TestUser")
+        User.objects.filter(pk=self.user.pk).update(first_name="Пётр")
+        users.invalidate()
+        self.assertEqual(other.get("TestUser").first_name, "Пётр")
+
+    @override_settings(IDENTITY_CACHE_SIZE=1)
+    def test_size_limit(self):
+        User.objects.create_user(username="Other")
+        users.get_or_404("TestUser")
+        users.get_or_404("Other")
+        with self.assertNumQueries(1):
+            users.get_or_404("TestUser")
+
+
+class JinjaTemplatesTestCase(TestCase):
+    def setUp(self):
+        if "jinja2" not in engines:
+            self.skipTest("Jinja2 не установлен")
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="TestUser", first_name="Лев", last_name="Толстой"
+        )
+        self.group = Group.objects.create(
+            title="Группа", slug="group", description="Описание"
+        )
+        Post.objects.bulk_create(
+            Post(text=f"Запись {i}", author=self.user) for i in range(15)
+        )
+        self.post = Post.objects.create(
+            text="Про <b>#Django</b>\nвторая строка",
+            author=self.user,
+            group=self.group,
+        )
+        Comment.objects.create(post=self.post, author=self.user, text="Ура")
+        self.client.force_login(self.user)
+
+    def render_both(self, url, data=None):
+        pages = []
+        for enabled in (False, True):
+            cache.clear()
+            with self.settings(JINJA2_TEMPLATES=enabled):
+                response = self.client.get(url, data)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.content.decode())
+        return pages
+
+    def assertSameFragments(self, pages, fragments):
+        for fragment in fragments:
+            with self.subTest(fragment=fragment):
+                self.assertIn(fragment, pages[0])
+                self.assertIn(fragment, pages[1])
+
+    def test_index(self):
+        pages = self.render_both(reverse("index"))
+        date = pages[0].split('<small class="text-muted">')[1].split("·")[0]
+        self.assertSameFragments(pages, [
+            "Про &lt;b&gt;<a href=\"/tag/django/\">#Django</a>&lt;/b&gt;<br>",
+            "Комментариев: 1",
+            "#Группа",
+            date.strip(),
+            '<a class="page-link" href="?page=2">2</a>',
+            'name="csrfmiddlewaretoken"',
+            "Пользователь: TestUser.",
+        ])
+
+    def test_profile_and_post(self):
+        pages = self.render_both(
+            reverse("profile", args=[self.user.username]), {"sort": "views"}
+        )
+        self.assertSameFragments(pages, [
+            "Лев Толстой",
+            "Записей: 16",
+            "?sort=views&amp;page=2",
+        ])
+        pages = self.render_both(
+            reverse("post", args=[self.user.username, self.post.id])
+        )
+        self.assertSameFragments(pages, [
+            'class="form-control"',
+            "<p>Ура</p>",
+            f'action="/{self.user.username}/{self.post.id}/comment"',
+        ])
+
+    def test_benchmark(self):
+        out = StringIO()
+        call_command("benchmark_templates", repeat=2, stdout=out, stderr=out)
+        self.assertIn("django:", out.getvalue())
+        self.assertIn("jinja2:", out.getvalue())
+        self.assertFalse(Post.objects.filter(author__username="benchmark_author"))
+
+
+class PrerenderTestCase(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = override_settings(
+            MEDIA_ROOT=media_root, PRERENDER_ENABLED=True
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        cache.clear()
+        counters.buffer.drain()
+        counters.buffer.seen.reset()
+        self.author = User.objects.create_user(username="Author")
+        self.group = Group.objects.create(
+            title="Группа", slug="group", description="Описание"
+        )
+        self.post = Post.objects.create(
+            text="Первая запись", author=self.author, group=self.group
+        )
+        self.assertEqual(render_all(), 4)
+        Task.objects.all().delete()
+
+    def get(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content).decode()
+
+    def run_tasks(self):
+        for pk in claim(100):
+            self.assertTrue(execute(pk))
+
+    def test_anonymous_gets_file(self):
+        post_url = reverse("post", args=["Author", self.post.id])
+        with self.assertNumQueries(0):
+            for path in ("/", "/group/group", "/Author/", post_url):
+                self.assertIn("Первая запись", self.get(path))
+        # Просмотр готовой страницы записи тоже засчитывается
+        self.assertEqual(counters.buffer.pending(self.post.id), 1)
+
+        self.client.force_login(self.author)
+        response = self.client.get(reverse("profile", args=["Author"]))
+        self.assertFalse(response.streaming)
+        self.assertIn("Выйти", response.content.decode())
+
+    def test_changes_regenerate_pages(self):
+        post = Post.objects.create(text="Новая запись", author=self.author)
+        Comment.objects.create(post=self.post, author=self.author, text="!")
+        # Одна задача на страницу, сколько бы изменений ни пришло
+        self.assertEqual(
+            Task.objects.filter(name="posts.prerender_page").count(), 4
+        )
+        self.run_tasks()
+        self.assertIn("Новая запись", self.get("/"))
+        self.assertIn("Комментариев: 1", self.get("/Author/"))
+        self.assertIn("Новая запись", self.get(f"/Author/{post.id}/"))
+
+        self.post.delete()
+        self.run_tasks()
+        self.assertNotIn("Первая запись", self.get("/"))
+        response = self.client.get(f"/Author/{self.post.id}/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_deleted_account_leaves_pages(self):
+        """Записи и комментарии удалённого аккаунта пропадают со всех
+        готовых страниц
+        """
+        reader = User.objects.create_user(username="Reader")
+        Comment.objects.create(
+            post=self.post, author=reader, text="Комментарий читателя"
+        )
+        Post.objects.create(
+            text="Запись читателя", author=reader, group=self.group
+        )
+        self.run_tasks()
+        self.assertIn("Запись читателя", self.get("/group/group"))
+        self.client.force_login(reader)
+        self.client.post(reverse("delete_account"))
+        self.run_tasks()
+        self.run_tasks()
+        self.assertFalse(User.objects.filter(username="Reader").exists())
+        self.assertNotIn("Запись читателя", self.get("/"))
+        self.assertNotIn("Запись читателя", self.get("/group/group"))
+        self.assertNotIn("Комментариев: 1", self.get("/Author/"))
+        self.assertNotIn(
+            "Комментарий читателя", self.get(f"/Author/{self.post.id}/")
+        )
+
+    def test_follow_regenerates_profiles(self):
+        reader = User.objects.create_user(username="Reader")
+        self.run_tasks()
+        self.client.force_login(reader)
+        self.client.get(reverse("profile_follow", args=["Author"]))
+        self.client.logout()
+        # Только профили: на готовых страницах записей счётчиков нет
+        self.assertEqual(
+            set(Task.objects.filter(status=Task.PENDING).values_list(
+                "name", flat=True
+            )),
+            {"posts.prerender_page"},
+        )
+        self.run_tasks()
+        self.assertIn("Подписчиков: 1", self.get("/Author/"))
+        self.assertNotIn(
+            "Подписчиков", self.get(f"/Author/{self.post.id}/")
+        )
+        self.assertIn("Подписан: 1", self.get("/Reader/"))
+
+    def test_page_name(self):
+        self.assertEqual(page_name("/"), "prerender/index.html")
+        self.assertEqual(page_name("/group/1"), "prerender/group/1.html")
+        self.assertEqual(
+            page_name("/group/1/"), "prerender/group/1/index.html"
+        )
+        self.assertIsNone(page_name("/../"))
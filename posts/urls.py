@@ -1,10 +1,13 @@
 from django.urls import path
-from . import views
+from . import feeds, views
 
 
 urlpatterns = [
     path("", views.index, name="index"),
+    path("rss/", feeds.latest_rss, name="feed_rss"),
+    path("atom/", feeds.latest_atom, name="feed_atom"),
     path("follow/", views.follow_index, name="follow_index"),
+    path("follow/bulk/", views.follow_bulk, name="follow_bulk"),
     path(
         "<str:username>/follow/",
         views.profile_follow,
@@ -15,15 +18,40 @@ urlpatterns = [
         views.profile_unfollow,
         name="profile_unfollow",
     ),
+    path(
+        "archive/<int:year>/<int:month>/",
+        views.archive,
+        name="archive",
+    ),
     path("new/", views.new_post, name="new_post"),
+    path("tag/<str:name>/", views.tag, name="tag"),
     path("group/<slug:slug>", views.group, name="group"),       
+    path(
+        "group/<slug:slug>/archive/<int:year>/<int:month>/",
+        views.group_archive,
+        name="group_archive",
+    ),
+    path("group/<slug:slug>/rss/", feeds.group_rss, name="group_rss"),
+    path("group/<slug:slug>/atom/", feeds.group_atom, name="group_atom"),
     path("<str:username>/", views.profile, name="profile"),
+    path("<str:username>/rss/", feeds.author_rss, name="profile_rss"),
+    path("<str:username>/atom/", feeds.author_atom, name="profile_atom"),
+    path(
+        "<str:username>/archive/<int:year>/<int:month>/",
+        views.profile_archive,
+        name="profile_archive",
+    ),
     path("<str:username>/<int:post_id>/", views.post_view, name="post"),
     path(
         "<str:username>/<int:post_id>/edit/",
         views.post_edit,
         name="post_edit",
     ),
+    path(
+        "<str:username>/<int:post_id>/like/",
+        views.like,
+        name="like",
+    ),
     path(
         "<username>/<int:post_id>/comment",
         views.add_comment,
@@ -1,42 +1,68 @@
-from django.http import request
+import datetime
+
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
 from django.contrib.auth import get_user_model
+from django.db.models import Count, Q
+from django.http import Http404
 from django.views.decorators.cache import cache_page
+from django.views.decorators.http import require_POST
+from django.utils import timezone
+
+from core.routers import read_only
+from core.views import send_media_file
 
-from .models import Post, Group, Comment, Follow
+from .models import (
+    Post, Comment, Follow, MonthlyPostCount, PostTag, Tag,
+)
 from .forms import PostForm, CommentForm
+from .identity import groups, users
+from .counters import record_view
+from .reactions import attach_like_counts, toggle_like
+from .prerender import schedule_profiles
+from .pagination import (
+    POSTS_PER_PAGE, decode_cursor, encode_cursor, paginate,
+)
+from .tasks import warm_thumbnail
 
 
 User = get_user_model()
 
 
+def feed_engine():
+    """Движок для горячих страниц: Jinja2, если он включён в настройках"""
+    return "jinja2" if settings.JINJA2_TEMPLATES else None
+
+
 @cache_page(1 * 20, key_prefix="index_page")
+@read_only
 def index(request):
-    post_list = Post.objects.all().select_related("author")
+    post_list = Post.objects.filter(
+        author__is_active=True
+    ).select_related("author")
     follow = False
     if request.user.is_authenticated:
         follow = Follow.objects.filter(user=request.user).exists()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
+    paginator, page = paginate(request, post_list, "index")
+    page.object_list = attach_like_counts(page.object_list)
     return render(
         request,
         "index.html", {
             "page": page,
             "paginator": paginator,
             "follow": follow,
-        }
+        },
+        using=feed_engine(),
     )
 
 
+@read_only
 def group(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    post_list = Post.objects.filter(group=group).all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
+    group = groups.get_or_404(slug)
+    post_list = Post.objects.filter(group=group, author__is_active=True)
+    paginator, page = paginate(request, post_list, f"group:{group.id}")
     return render(
         request,
         "group.html", {
@@ -54,6 +80,10 @@ def new_post(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        if post.image:
+            warm_thumbnail.delay(
+                post.id, dedup_key=f"thumbnail:{post.image.name}"
+            )
         return redirect("index")
     form = PostForm()
     return render(
@@ -64,13 +94,16 @@ def new_post(request):
     )   
 
 
+@read_only
 def profile(request, username):
-    profile  = get_object_or_404(User, username=username)
+    profile = users.get_or_404(username, is_active=True)
     post_list = profile.posts.all()
-    paginator = Paginator(post_list, 10)
-    posts_count = post_list.count()
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
+    sort = "views" if request.GET.get("sort") == "views" else None
+    if sort:
+        post_list = post_list.order_by("-views", "-pk")
+    paginator, page = paginate(request, post_list, f"profile:{profile.id}")
+    page.object_list = attach_like_counts(page.object_list)
+    posts_count = paginator.count
     followers = Follow.objects.filter(author=profile.id).count()
     follows = Follow.objects.filter(user=profile.id).count()
     following = Follow.objects.filter(
@@ -87,19 +120,28 @@ def profile(request, username):
             "followers": followers,
             "follows": follows,
             "following": following,
-        }
+            "sort": sort,
+        },
+        using=feed_engine(),
     )
  
  
+@read_only
 def post_view(request, username, post_id):
-    profile  = get_object_or_404(User, username=username)
+    profile = users.get_or_404(username, is_active=True)
     post = get_object_or_404(Post, id=post_id)
-    post_list = profile.posts.all()
-    posts_count = post_list.count()
+    attach_like_counts([post])
+    record_view(request, post)
+    # Готовая страница записи обходится без счётчиков автора: иначе её
+    # пришлось бы перерисовывать при каждой подписке и новой записи
+    counts_hidden = getattr(request, "prerendering", False)
+    posts_count = followers = follows = None
+    if not counts_hidden:
+        posts_count = profile.posts.count()
+        followers = Follow.objects.filter(author=profile.id).count()
+        follows = Follow.objects.filter(user=profile.id).count()
     form = CommentForm()
     comments = post.comments.all()
-    followers = Follow.objects.filter(author=profile.id).count()
-    follows = Follow.objects.filter(user=profile.id).count()
     if request.user.is_authenticated:
         following = Follow.objects.filter(
             author=profile.id, 
@@ -115,7 +157,9 @@ def post_view(request, username, post_id):
             "comments": comments,
             "followers": followers,
             "follows": follows,
-        }
+            "counts_hidden": counts_hidden,
+        },
+        using=feed_engine(),
     )
 
 
@@ -131,7 +175,11 @@ def post_edit(request, username, post_id):
         instance=post
     )
     if request.method == "POST":
-        form.save()
+        post = form.save()
+        if "image" in form.changed_data and post.image:
+            warm_thumbnail.delay(
+                post.id, dedup_key=f"thumbnail:{post.image.name}"
+            )
         return redirect(
             "post",
             username=request.user.username,
@@ -165,7 +213,8 @@ def server_error(request):
 
 @login_required
 def add_comment(request, username, post_id):
-    post = get_object_or_404(Post, pk=post_id, author__username=username)
+    author = users.get_or_404(username)
+    post = get_object_or_404(Post, pk=post_id, author_id=author.id)
     form = CommentForm(request.POST)
     comments = post.comments.all()
     if form.is_valid():
@@ -186,12 +235,28 @@ def add_comment(request, username, post_id):
     
 
 @login_required
+@require_POST
+def like(request, username, post_id):
+    """Ставит или снимает лайк; в базу он попадёт при сбросе буфера"""
+    if not Post.objects.filter(
+        pk=post_id, author__username=username
+    ).exists():
+        raise Http404
+    toggle_like(post_id, request.user.id)
+    return redirect("post", username=username, post_id=post_id)
+
+
+@login_required
+@read_only
 def follow_index(request):
-    follower = get_object_or_404(User, username=request.user.username)
-    post_list = Post.objects.filter(author__following__user=follower).all()
-    paginator = Paginator(post_list, 10) 
-    page_number = request.GET.get("page") 
-    page = paginator.get_page(page_number)
+    post_list = Post.objects.filter(
+        author__following__user=request.user,
+        author__is_active=True,
+    )
+    paginator, page = paginate(
+        request, post_list, f"follow:{request.user.id}"
+    )
+    page.object_list = attach_like_counts(page.object_list)
     return render(
         request,
         "follow.html", {
@@ -203,24 +268,139 @@ def follow_index(request):
 
 @login_required
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
-    follower = request.user
-    if author.id != follower.id:
-        Follow.objects.get_or_create(user=follower, author=author, defaults={
-            "user": follower, "author": author
-            }
-        )
+    author = users.get_or_404(username, is_active=True)
+    Follow.objects.follow(request.user, [author.id])
+    schedule_profiles(request.user.username, author.username)
     return redirect("profile", username=username)
 
 
 @login_required
 def profile_unfollow(request, username):
-    follower = request.user
-    author = get_object_or_404(User, username=username)
-    follow_check = Follow.objects.filter( 
-        user=follower.id, 
-        author=author.id, 
-    )
-    if follow_check.exists(): 
-        follow_check.delete() 
+    author = users.get_or_404(username)
+    Follow.objects.filter(user=request.user, author=author).delete()
+    schedule_profiles(request.user.username, author.username)
     return redirect("profile", username=username)
+
+
+@login_required
+@require_POST
+def follow_bulk(request):
+    authors = dict(User.objects.filter(
+        username__in=request.POST.getlist("authors"),
+        is_active=True,
+    ).values_list("id", "username"))
+    if request.POST.get("action") == "unfollow":
+        Follow.objects.unfollow(request.user, list(authors))
+    else:
+        Follow.objects.follow(request.user, list(authors))
+    schedule_profiles(request.user.username, *authors.values())
+    return redirect("follow_index")
+
+
+def month_archive(request, post_list, scope, object_id, year, month, extra):
+    if not (1 <= month <= 12 and datetime.MINYEAR <= year < datetime.MAXYEAR):
+        raise Http404
+    start = datetime.date(year, month, 1)
+    months = list(MonthlyPostCount.objects.for_scope(scope, object_id))
+    month_count = next((m.count for m in months if m.month == start), 0)
+    end = (start + datetime.timedelta(days=31)).replace(day=1)
+    tz = timezone.get_current_timezone()
+    post_list = post_list.filter(
+        author__is_active=True,
+        pub_date__gte=timezone.make_aware(
+            datetime.datetime.combine(start, datetime.time()), tz
+        ),
+        pub_date__lt=timezone.make_aware(
+            datetime.datetime.combine(end, datetime.time()), tz
+        ),
+    ).select_related("author", "group").annotate(
+        comment_count=Count("comments")
+    )
+    paginator = Paginator(post_list, 10)
+    # Число постов месяца уже известно, отдельный COUNT(*) не нужен
+    paginator.count = month_count
+    page = paginator.get_page(request.GET.get("page"))
+    page.object_list = attach_like_counts(page.object_list)
+    return render(
+        request,
+        "archive.html", {
+            "page": page,
+            "paginator": paginator,
+            "months": months,
+            "month": start,
+            **extra,
+        }
+    )
+
+
+@read_only
+def archive(request, year, month):
+    return month_archive(
+        request, Post.objects.all(), MonthlyPostCount.SITE, 0,
+        year, month, {},
+    )
+
+
+@read_only
+def group_archive(request, slug, year, month):
+    group = groups.get_or_404(slug)
+    return month_archive(
+        request, group.posts.all(), MonthlyPostCount.GROUP, group.id,
+        year, month, {"group": group},
+    )
+
+
+@read_only
+def profile_archive(request, username, year, month):
+    profile = users.get_or_404(username, is_active=True)
+    return month_archive(
+        request, profile.posts.all(), MonthlyPostCount.AUTHOR, profile.id,
+        year, month, {"profile": profile},
+    )
+
+
+@read_only
+def tag(request, name):
+    """Записи с тегом. Страницы листаются курсором (дата и ключ
+    последней записи), поэтому каждая читается по индексу
+    (tag, pub_date) без OFFSET и COUNT(*)
+    """
+    tag = get_object_or_404(Tag, name=name.lower())
+    links = PostTag.objects.filter(
+        tag=tag, post__author__is_active=True
+    ).order_by("-pub_date", "-post_id")
+    cursor = decode_cursor(request.GET.get("cursor"))
+    if cursor is not None:
+        pub_date, post_id = cursor
+        links = links.filter(
+            Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, post_id__lt=post_id)
+        )
+    links = list(
+        links.values_list("post_id", "pub_date")[:POSTS_PER_PAGE + 1]
+    )
+    next_cursor = None
+    if len(links) > POSTS_PER_PAGE:
+        links = links[:POSTS_PER_PAGE]
+        post_id, pub_date = links[-1]
+        next_cursor = encode_cursor(pub_date, post_id)
+    posts = attach_like_counts(Post.objects.filter(
+        pk__in=[post_id for post_id, _ in links]
+    ).select_related("author", "group").annotate(
+        comment_count=Count("comments")
+    ).order_by("-pub_date", "-pk"))
+    return render(
+        request,
+        "tag.html", {
+            "tag": tag,
+            "posts": posts,
+            "next_cursor": next_cursor,
+            "is_first_page": cursor is None,
+        }
+    )
+
+
+def sitemap(request, name):
+    """Файлы карты сайта из корня сайта: протокол sitemaps допускает в
+    файле только адреса из его каталога
+    """
+    return send_media_file(request, f"{settings.SITEMAP_DIR}/{name}")
@@ -0,0 +1,58 @@
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+from core.cache import shared_cache
+
+
+USER_CACHE_KEY = "auth_user:{}"
+USER_CACHE_TIMEOUT = 60 * 60
+
+
+def user_cache_key(user_id):
+    return USER_CACHE_KEY.format(user_id)
+
+
+def get_cached_user(request):
+    """Пользователь сессии из кэша. Запись хранит хэш сессии (отпечаток
+    хэша пароля), поэтому смена пароля сразу делает её недействительной.
+    Правка пользователя удаляет запись из общего для всех процессов
+    кэша shared_cache (проверка core.E001)
+    """
+    if hasattr(request, "_cached_user"):
+        return request._cached_user
+    session = request.session
+    user_id = session.get(auth.SESSION_KEY)
+    backend_path = session.get(auth.BACKEND_SESSION_KEY)
+    session_hash = session.get(auth.HASH_SESSION_KEY)
+    user = None
+    if (
+        user_id is not None
+        and session_hash
+        and backend_path in settings.AUTHENTICATION_BACKENDS
+    ):
+        cached = shared_cache.get(user_cache_key(user_id))
+        if cached is not None:
+            cached_hash, cached_backend, cached_user = cached
+            if (
+                cached_backend == backend_path
+                and constant_time_compare(cached_hash, session_hash)
+            ):
+                user = cached_user
+    if user is None:
+        user = auth.get_user(request)
+        if user.is_authenticated:
+            shared_cache.set(
+                user_cache_key(user.pk),
+                (user.get_session_auth_hash(), backend_path, user),
+                USER_CACHE_TIMEOUT,
+            )
+    request._cached_user = user
+    return user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    def process_request(self, request):
+        request.user = SimpleLazyObject(lambda: get_cached_user(request))
@@ -1,3 +1,154 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.test import TestCase, Client, override_settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils import timezone
+
+from core.cache import InstrumentedFileBasedCache, shared_cache
+from core.models import Blob, Task
+from core.tasks import claim, execute
+from posts.models import Comment, Follow, Group, MonthlyPostCount, Post
+
+
+User = get_user_model()
+
+
+class CachedAuthTestCase(TestCase):
+    def setUp(self):
+        shared_cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username = "TestUser",
+            email = "testovy@email.com",
+            password = "1fx6|unz#i",
+        )
+        self.client.login(username="TestUser", password="1fx6|unz#i")
+
+    def test_warm_cache_no_queries(self):
+        """При прогретом кэше сессия и пользователь не требуют запросов"""
+        url = reverse("password_change")
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["user"], self.user)
+
+    def test_password_change_invalidates(self):
+        """После смены пароля закэшированный пользователь не используется"""
+        url = reverse("password_change")
+        self.client.get(url)
+        self.user.set_password("новый_пароль_123")
+        self.user.save()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 302)
+
+    def test_deactivation_in_other_process(self):
+        """Отключение аккаунта в другом процессе сразу видно и этому"""
+        url = reverse("password_change")
+        self.client.get(url)
+        config = settings.CACHES["shared"]
+        other_cache = InstrumentedFileBasedCache(config["LOCATION"], config)
+        with mock.patch("users.signals.shared_cache", other_cache):
+            self.user.is_active = False
+            self.user.save()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 302)
+
+
+GIF = (
+    b"\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x80\x00\x00\x05\x04"
+    b"\x04\x00\x00\x00\x2c\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02"
+    b"\x44\x01\x00\x3b"
+)
+
+
+@override_settings(USER_DELETE_BATCH_SIZE=2)
+class DeleteAccountTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.user = User.objects.create_user(username="TestUser")
+        self.other = User.objects.create_user(username="OtherUser")
+        group = Group.objects.create(
+            title="Тестовая группа", slug="testgroup", description="Описание"
+        )
+        for i in range(5):
+            post = Post.objects.create(
+                text=f"Запись {i}", author=self.user, group=group
+            )
+            Comment.objects.create(post=post, author=self.other, text="Ок")
+        Post.objects.create(
+            text="С картинкой",
+            author=self.user,
+            image=SimpleUploadedFile("pic.gif", GIF),
+        )
+        other_post = Post.objects.create(text="Чужая", author=self.other)
+        for i in range(3):
+            Comment.objects.create(post=other_post, author=self.user, text="!")
+        Follow.objects.create(user=self.user, author=self.other)
+        Follow.objects.create(user=self.other, author=self.user)
+        self.client.force_login(self.user)
+
+    def test_hidden_at_once(self):
+        """Записи отключённого аккаунта пропадают из лент до того, как
+        задача их удалит, а подписаться на него нельзя
+        """
+        Post.objects.create(text="Запись #тег", author=self.user)
+        self.client.post(reverse("delete_account"))
+        cache.clear()
+        self.client.force_login(self.other)
+        now = timezone.localtime()
+        for url in (
+            reverse("index"),
+            reverse("group", args=["testgroup"]),
+            reverse("tag", args=["тег"]),
+            reverse("archive", args=[now.year, now.month]),
+            reverse("group_archive", args=["testgroup", now.year, now.month]),
+            reverse("follow_index"),
+            reverse("feed_rss"),
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotContains(response, "Запись")
+        response = self.client.get(reverse("profile_follow", args=["TestUser"]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_delete_account(self):
+        """Пользователь скрывается сразу, а данные удаляет задача"""
+        response = self.client.post(reverse("delete_account"))
+        self.assertRedirects(response, reverse("index"))
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertEqual(
+            self.client.get(reverse("profile", args=["TestUser"])).status_code,
+            404,
+        )
+        self.assertTrue(Post.objects.filter(author=self.user).exists())
+
+        for pk in claim(10):
+            self.assertTrue(execute(pk))
+        self.assertFalse(Task.objects.exists())
+        self.assertFalse(User.objects.filter(username="TestUser").exists())
+        self.assertEqual(list(Post.objects.values_list("text", flat=True)),
+                         ["Чужая"])
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(Blob.objects.get().refcount, 0)
+        counts = MonthlyPostCount.objects.filter(count__gt=0)
+        self.assertEqual(
+            sorted(counts.values_list("scope", "object_id", "count")),
+            [("author", self.other.pk, 1), ("site", 0, 1)],
+        )
 
-# Create your tests here.
@@ -1,10 +1,30 @@
-from django.shortcuts import render
+from django.contrib.auth import logout
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import redirect, render
 from django.views.generic import CreateView
 from django.urls import reverse_lazy
+
+from posts.tasks import delete_user
+
 from .forms import CreationForm
 
 
 class SignUp(CreateView):
     form_class = CreationForm
     succes_url = reverse_lazy("login")
-    template_name = "signup.html"
\ No newline at end of file
+    template_name = "signup.html"
+
+
+@login_required
+def delete_account(request):
+    """Сразу скрывает пользователя и выходит из аккаунта, а его данные
+    удаляет фоновая задача
+    """
+    if request.method != "POST":
+        return render(request, "delete_account.html")
+    user = request.user
+    user.is_active = False
+    user.save(update_fields=["is_active"])
+    logout(request)
+    delete_user.delay(user.pk, dedup_key=f"delete_user:{user.pk}")
+    return redirect("index")
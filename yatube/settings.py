@@ -1,4 +1,5 @@
 import os
+from importlib.util import find_spec
 
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -17,6 +18,7 @@ ALLOWED_HOSTS = [
 INSTALLED_APPS = [
     'users',
     'posts',
+    'core',
     'django.contrib.sites',
     'django.contrib.flatpages',
     'django.contrib.admin',
@@ -31,10 +33,15 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.MetricsMiddleware',
+    'core.profiler.ProfilerMiddleware',
+    'core.middleware.CompressionMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'users.middleware.CachedAuthenticationMiddleware',
+    'posts.middleware.PrerenderedPageMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
@@ -50,7 +57,8 @@ TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.DjangoTemplates',
+        'NAME': 'django',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -64,15 +72,43 @@ TEMPLATES = [
     },
 ]
 
+# Необязательный Jinja2 для горячих страниц: ленты, профиля и записи.
+# Шаблоны лежат в templates/jinja2, включается JINJA2_TEMPLATES
+if find_spec("jinja2") is not None:
+    TEMPLATES.append({
+        'BACKEND': 'core.jinja2.Jinja2',
+        'NAME': 'jinja2',
+        'DIRS': [os.path.join(TEMPLATES_DIR, "jinja2")],
+        'APP_DIRS': False,
+        'OPTIONS': {
+            'environment': 'core.jinja2.environment',
+            'context_processors': [
+                'django.contrib.auth.context_processors.auth',
+            ],
+        },
+    })
+JINJA2_TEMPLATES = False
+
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db_replica.sqlite3'),
+    },
 }
 
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# Алиасы реплик для чтения во view с @read_only; пусто — читаем из default
+REPLICA_DATABASES = []
+REPLICA_STICKY_COOKIE = 'use_primary'
+REPLICA_STICKY_SECONDS = 10
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -100,20 +136,136 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, "static")
+STATICFILES_STORAGE = 'core.storage.CompressedManifestStaticFilesStorage'
+STATIC_HASHED_MAX_AGE = 60 * 60 * 24 * 365
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media') 
+# Отдача медиа фронтендом: None, 'x-sendfile' (Apache, lighttpd) или
+# 'x-accel-redirect' (nginx, internal-location с префиксом ниже)
+MEDIA_SENDFILE = None
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+# По адресу /media/ доступны только картинки записей и миниатюры sorl;
+# временные загрузки, карта сайта и готовые страницы туда не попадают
+MEDIA_PUBLIC_PREFIXES = ('posts/', 'cache/')
+# Карта сайта собирается командой build_sitemaps в MEDIA_ROOT/SITEMAP_DIR
+SITEMAP_DIR = 'sitemaps'
+SITEMAP_SHARD_SIZE = 50000
+SITEMAP_PROTOCOL = 'https'
+# Сколько файл без ссылок живёт до удаления командой collect_blobs
+BLOB_GC_GRACE = 60 * 60 * 24
 
 LOGIN_URL = "/auth/login/"
 LOGIN_REDIRECT_URL = "index" 
 
-EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
+# Письма сохраняются в таблицу outbox, а отправляет их задача очереди
+# или manage.py send_outbox через EMAIL_DELIVERY_BACKEND
+EMAIL_BACKEND = "core.mail.OutboxEmailBackend"
+EMAIL_DELIVERY_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails") 
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_DELAY = 60
+OUTBOX_MAX_RETRY_DELAY = 60 * 60
+OUTBOX_LOCK_TIMEOUT = 10 * 60
+# Сколько секунд отправленное письмо хранится в outbox до удаления
+OUTBOX_SENT_RETENTION = 60 * 60 * 24 * 7
 
 SITE_ID = 1 
 
+TEST_RUNNER = "core.testing.TestRunner"
+
+# Кэш по умолчанию живёт в памяти процесса. Всё, что должно быть видно
+# сразу всем процессам сервера и воркеру run_tasks (сессии, пользователи
+# сессий, поколения кэшей пользователей и групп, состояние лайков),
+# хранится в общем кэше 'shared' (core.cache.shared_cache)
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache.InstrumentedLocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'core.cache.InstrumentedFileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+        },
+    },
 }
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'shared'
+
+# Сколько секунд закэшированное число постов в ленте считается свежим
+PAGINATOR_COUNT_TTL = 60
+
+COMPRESSION_MIN_SIZE = 512
+COMPRESSION_CONTENT_TYPES = (
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/xml',
+    'application/javascript',
+    'application/json',
+    'application/xml',
+    'application/rss+xml',
+    'application/atom+xml',
+    'image/svg+xml',
+)
+# Уровень сжатия: выше — меньше байт, но больше CPU на каждый ответ
+COMPRESSION_LEVELS = {
+    'gzip': 6,
+    'br': 5,
+}
+
+# Общий каталог, через который /metrics собирает значения всех воркеров;
+# без него отдаются метрики только текущего процесса
+METRICS_DIR = None
+METRICS_FLUSH_INTERVAL = 5
+METRICS_ALLOWED_IPS = INTERNAL_IPS
+
+# Запросы дольше порога (в секундах) пишутся в лог core.sql с местом вызова
+SLOW_QUERY_THRESHOLD = 0.1
+SLOW_QUERY_TOP_N = 20
+SLOW_QUERY_MAX_FINGERPRINTS = 1000
+# Обработчик SIGUSR1, печатающий топ запросов процесса. Включайте только
+# там, где сигнал больше никем не занят: у gunicorn, например, SIGUSR1
+# переоткрывает логи
+SLOW_QUERY_DUMP_SIGNAL = False
+
+# Локальная очередь задач (core.tasks, воркер: manage.py run_tasks)
+TASKS_WORKERS = 4
+TASKS_MAX_ATTEMPTS = 5
+TASKS_RETRY_DELAY = 10
+TASKS_MAX_RETRY_DELAY = 60 * 60
+TASKS_LOCK_TIMEOUT = 10 * 60
+TASKS_POLL_INTERVAL = 1
+
+# Строк на одно DELETE при фоновом удалении пользователя
+USER_DELETE_BATCH_SIZE = 500
+# Как часто лайки из кэша переносятся в базу, секунд
+LIKES_FLUSH_INTERVAL = 5
+# Как часто процесс отдаёт накопленные просмотры в очередь, секунд
+VIEWS_FLUSH_INTERVAL = 30
+# Фильтр повторных просмотров: размер в битах, число хэшей и время,
+# после которого тот же посетитель засчитывается снова
+VIEWS_DEDUP_BITS = 8 * 1024 * 1024
+VIEWS_DEDUP_HASHES = 4
+VIEWS_DEDUP_WINDOW = 60 * 60
+
+# Кэш пользователей и групп по username и slug в памяти процесса:
+# число записей, их время жизни и как часто сверять поколение с
+# общим кэшем, секунд
+IDENTITY_CACHE_SIZE = 10000
+IDENTITY_CACHE_TTL = 5 * 60
+IDENTITY_CACHE_CHECK_INTERVAL = 1
+
+# Готовые страницы для анонимных посетителей в MEDIA_ROOT/PRERENDER_DIR
+# (см. posts.prerender); первую сборку делает команда prerender
+PRERENDER_ENABLED = False
+PRERENDER_DIR = "prerender"
+
+PROFILER_ENABLED = False
+PROFILER_SAMPLE_RATE = 0.01
+PROFILER_DIR = os.path.join(BASE_DIR, "profiles")
+PROFILER_HEADER = 'X-Profile'
+PROFILER_TOKEN_MAX_AGE = 60 * 60
@@ -1,28 +1,45 @@
 from django.contrib import admin
-from django.urls import include, path
-from django.contrib.flatpages import views
+from django.urls import include, path, re_path
 from django.conf.urls import handler404, handler500
 from django.conf import settings
-from django.conf.urls.static import static
+
+from core.views import flatpage, metrics, serve_media, serve_static
+from posts.views import sitemap
 
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('about/', include('django.contrib.flatpages.urls')),
+    path('about/<path:url>', flatpage),
     path(
         'about-author/',
-        views.flatpage, {
+        flatpage, {
             'url': '/about-author/'
         }, name='about-author'
     ),
     path(
         'about-spec/',
-        views.flatpage, {
+        flatpage, {
             'url': '/about-spec/'
         }, name='about-spec'
     ),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
+    re_path(
+        r'^%s(?P<path>.*)$' % settings.STATIC_URL.lstrip('/'),
+        serve_static,
+        name='static'
+    ),
+    re_path(
+        r'^%s(?P<path>.*)$' % settings.MEDIA_URL.lstrip('/'),
+        serve_media,
+        name='media'
+    ),
+    re_path(
+        r'^(?P<name>sitemap(-[\w-]+)?\.xml)$',
+        sitemap,
+        name='sitemap'
+    ),
+    path('metrics', metrics, name='metrics'),
     path('', include('posts.urls')),
 ] 
 
@@ -34,11 +51,3 @@ handler500 = "posts.views.server_error" # noqa
 if settings.DEBUG:
     import debug_toolbar
     urlpatterns += (path("__debug__/", include(debug_toolbar.urls)),)
-    urlpatterns += static(
-        settings.MEDIA_URL,
-        document_root=settings.MEDIA_ROOT
-    )
-    urlpatterns += static(
-        settings.STATIC_URL,
-        document_root=settings.STATIC_ROOT
-    )